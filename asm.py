@@ -1,4 +1,7 @@
-from uint import Uint6, UintN
+import functools
+import time
+
+from stack import Stack
 
 asm_ref_sheet = """Commands:
 FIRST:   return the first input
@@ -51,7 +54,7 @@ def cmd_jmpzero(asm):
 
 
 def cmd_push(asm):
-    asm.stack.append(asm.pipe1)
+    asm.stack.push(asm.pipe1)
     return asm.pipe1, None
 
 
@@ -62,22 +65,12 @@ def cmd_pop(asm):
 
 
 def cmd_swap(asm):
-    if len(asm.stack) == 0:
-        first = 0
-    else:
-        first = asm.stack.pop()
-
-    if len(asm.stack) == 0:
-        second = 0
-    else:
-        second = asm.stack.pop()
-    asm.stack.append(first)
-    asm.stack.append(second)
+    asm.stack.swap()
     return asm.pipe1, None
 
 
 def cmd_append(asm):
-    asm.stack.insert(0, asm.pipe1)
+    asm.stack.append_bottom(asm.pipe1)
     return asm.pipe1, None
 
 
@@ -87,30 +80,56 @@ def cmd_output(asm):
 
 
 def run_ucode_as_cmd(asm, ucode):
-    input1 = Uint6(asm.pipe1).bits()
-    input2 = Uint6(asm.pipe2).bits()
-    addr = Uint6(asm.pc).bits()
-    _, output, jump = ucode.run(input1, input2, addr)
-    output = UintN.from_bits(output).number
-    jump = UintN.from_bits(jump).number
+    _, output, jump = ucode.run(asm.pipe1, asm.pipe2, asm.pc)
     return output, jump
 
 
+def run_ucode_as_table(asm, ucode):
+    return ucode.lookup(asm.pipe1, asm.pipe2, asm.pc)
+
+
+def run_ucode_cached(asm, ucode):
+    return ucode.run_cached((asm.pipe1 << 12) | (asm.pipe2 << 6) | asm.pc)
+
+
+# Ways to run a CUST: building the UCode's whole table up front, remembering
+# results as they come up, or running it every time
+cust_modes = {
+    "table": run_ucode_as_table,
+    "cached": run_ucode_cached,
+    "run": run_ucode_as_cmd,
+}
+
+
 def cmd_cust1(asm):
-    output, jump = run_ucode_as_cmd(asm, asm.ucodes[0])
+    output, jump = run_ucode_as_table(asm, asm.ucodes[0])
     return output, jump
 
 
 def cmd_cust2(asm):
-    output, jump = run_ucode_as_cmd(asm, asm.ucodes[1])
+    output, jump = run_ucode_as_table(asm, asm.ucodes[1])
     return output, jump
 
 
 def cmd_cust3(asm):
-    output, jump = run_ucode_as_cmd(asm, asm.ucodes[2])
+    output, jump = run_ucode_as_table(asm, asm.ucodes[2])
     return output, jump
 
 
+def make_cust_cmd(n, run_ucode):
+    def cmd(asm):
+        return run_ucode(asm, asm.ucodes[n])
+
+    return cmd
+
+
+def cust_cmds(mode):
+    """cmd_cust1-3 running their UCodes with cust_modes[mode], for compile_cmd"""
+    if mode == "table":
+        return {f"cmd_cust{n + 1}": commands[f"cust{n + 1}"] for n in range(3)}
+    return {f"cmd_cust{n + 1}": make_cust_cmd(n, cust_modes[mode]) for n in range(3)}
+
+
 commands = {
     "add": cmd_add,
     "sub": cmd_sub,
@@ -133,9 +152,304 @@ def make_literal_fn(literal):
     def fn(asm):
         return literal, None
 
+    fn.literal = literal
+    return fn
+
+
+command_names = {fn: name for name, fn in commands.items()}
+
+
+def _compile_word(word, pipes, temp, addr=None):
+    """Python source for one command, given the expressions for its inputs.
+
+    Returns the statements to run, in order, and the result: either a
+    constant, or a variable that nothing else writes to (possibly `temp`).
+    The statements use `stack` and `output` for the machine's stack and
+    output method. With addr, CUSTs index tables named like `cust1_5` (see
+    UCode.address_table) instead of calling cmd_cust1.
+    """
+    p1, p2 = pipes
+    if hasattr(word, "literal"):
+        return [], str(word.literal)
+
+    name = command_names[word]
+    if name in ["add", "sub"]:
+        op = "+" if name == "add" else "-"
+        if p1.isdigit() and p2.isdigit():
+            return [], str(eval(f"({p1} {op} {p2}) % 64"))
+        return [f"{temp} = ({p1} {op} {p2}) % 64"], temp
+    elif name == "first":
+        return [], p1
+    elif name == "second":
+        return [], p2
+    elif name == "jmp":
+        return [f"next_pc = {p1}"], p1
+    elif name == "jmpzero":
+        if p2.isdigit():
+            return ([f"next_pc = {p1}"] if p2 == "0" else []), p1
+        return [f"if {p2} == 0:", f"    next_pc = {p1}"], p1
+    elif name == "push":
+        return [f"stack.push({p1})"], p1
+    elif name == "pop":
+        return [f"{temp} = stack.pop() % 64 if stack else 0"], temp
+    elif name == "swap":
+        return ["stack.swap()"], p1
+    elif name == "append":
+        return [f"stack.append_bottom({p1})"], p1
+    elif name == "output":
+        return [f"output({p1})"], p1
+
+    # No jump from a CUST still overrides earlier ones on the line
+    if addr is not None:
+        return [f"{temp}, next_pc = {name}_{addr}[({p1} << 6) | {p2}]"], temp
+    stmts = [f"asm.pipe1 = {p1}", f"asm.pipe2 = {p2}"]
+    return stmts + [f"{temp}, next_pc = cmd_{name}(asm)"], temp
+
+
+def _compile_body(cmd, addr=None):
+    body = []
+    pipes = ["0", "0"]
+    for i, subcmd in enumerate(cmd):
+        values = []
+        for k, word in enumerate(subcmd):
+            stmts, value = _compile_word(word, pipes, f"v{i}_{k}", addr)
+            body += stmts
+            values.append(value)
+        if len(values) == 1:
+            values.append("0")
+
+        # Results are constants or variables of their own, so there's no need
+        # to copy them before the next sub-command
+        pipes = values
+
+    return body
+
+
+def compile_cmd(cmd, overrides=None, cust="table"):
+    """Turn one parsed line into a single function of the machine.
+
+    The function runs the whole line and returns the line to jump to, or None
+    to continue to the next line. Literals are inlined, and its `jumps`
+    attribute says whether it can ever jump. CUSTs run as cust_cmds(cust), and
+    overrides maps names like "cmd_cust1" to functions to call instead.
+    Without overrides, lines that compile to the same source share a function.
+    """
+    body = _compile_body(cmd)
+
+    jumps = any("next_pc" in stmt for stmt in body)
+    if jumps:
+        body = ["next_pc = None"] + body + ["return next_pc"]
+    elif not body:
+        body = ["pass"]
+    if any("stack" in stmt for stmt in body):
+        body = ["stack = asm.stack"] + body
+    if any("output(" in stmt for stmt in body):
+        body = ["output = asm.output"] + body
+
+    source = "\n".join(["def line(asm):"] + ["    " + stmt for stmt in body])
+    if overrides is None:
+        fn = _exec_line(source, cust)
+    else:
+        namespace = {"cmd_" + name: fn for name, fn in commands.items()}
+        namespace.update(overrides)
+        exec(compile(source, "<asm line>", "exec"), namespace)
+        fn = namespace["line"]
+
+    fn.jumps = jumps
     return fn
 
 
+@functools.lru_cache(maxsize=1024)
+def _exec_line(source, cust):
+    namespace = {"cmd_" + name: fn for name, fn in commands.items()}
+    namespace.update(cust_cmds(cust))
+    exec(compile(source, "<asm line>", "exec"), namespace)
+    return namespace["line"]
+
+
+@functools.lru_cache(maxsize=256)
+def _exec_program(source):
+    namespace = {}
+    exec(compile(source, "<asm program>", "exec"), namespace)
+    return namespace["program"]
+
+
+def _dispatch(lines, lo, hi):
+    """Source picking between lines lo to hi by pc, as a binary search"""
+    if hi - lo == 1:
+        return lines[lo]
+    mid = (lo + hi) // 2
+    return (
+        [f"if pc < {mid}:"]
+        + ["    " + stmt for stmt in _dispatch(lines, lo, mid)]
+        + ["else:"]
+        + ["    " + stmt for stmt in _dispatch(lines, mid, hi)]
+    )
+
+
+def compile_program(cmds):
+    """Turn a whole parsed program into one function, program(asm, budget, stop).
+
+    It runs lines from asm.pc until it has run budget of them, stop() returns
+    True after a line that outputs, or the next line is past the last
+    non-blank one (its `end` attribute), and returns how many lines it ran.
+    asm.pc is left at the next line, which may be num_lines or more: unlike
+    step(), it doesn't go back to 0. While a line outputs, asm.pc is that line,
+    as it is under step(). CUSTs look up tables from the machine's UCodes
+    rather than running them. Every line must have parsed.
+
+    Programs that compile to the same source share one function.
+    """
+    end = 0
+    for i, cmd in enumerate(cmds):
+        if cmd:
+            end = i + 1
+
+    setup = ["stack = asm.stack", "output = asm.output"]
+    lines = []
+    for i, cmd in enumerate(cmds[:end]):
+        body = _compile_body(cmd, i)
+        for n in range(3):
+            if any(f"cust{n + 1}_{i}[" in stmt for stmt in body):
+                setup.append(f"cust{n + 1}_{i} = asm.ucodes[{n}].address_table({i})")
+
+        if any("next_pc" in stmt for stmt in body):
+            body = ["next_pc = None"] + body
+            body.append(f"pc = {i + 1} if next_pc is None else next_pc")
+        else:
+            body.append(f"pc = {i + 1}")
+        if any("output(" in stmt for stmt in body):
+            body = [f"asm.pc = {i}"] + body
+            body += ["if stop is not None and stop():", "    break"]
+        lines.append(body)
+
+    source = [
+        "def program(asm, budget, stop):",
+        "    pc = asm.pc",
+        "    steps = 0",
+    ]
+    source += ["    " + stmt for stmt in setup]
+    if lines:
+        loop = [f"while steps < budget and pc < {end}:", "    steps += 1"]
+        loop += ["    " + stmt for stmt in _dispatch(lines, 0, end)]
+        source += ["    " + stmt for stmt in loop]
+    source += ["    asm.pc = pc", "    return steps"]
+
+    program = _exec_program("\n".join(source))
+    program.end = end
+    return program
+
+
+class Profile:
+    """Where a profiled Asm spent its steps and time.
+
+    line_hits and line_time count the runs and seconds of each line, and
+    cust_calls and cust_time the same for CUST1-3. Time in a CUST is also
+    counted in its line's time.
+    """
+
+    def __init__(self, num_lines):
+        self.line_hits = [0] * num_lines
+        self.line_time = [0.0] * num_lines
+        self.cust_calls = [0, 0, 0]
+        self.cust_time = [0.0, 0.0, 0.0]
+
+    def snapshot(self):
+        """The counts so far, for restore()"""
+        return (
+            tuple(self.line_hits),
+            tuple(self.line_time),
+            tuple(self.cust_calls),
+            tuple(self.cust_time),
+        )
+
+    def restore(self, snapshot):
+        # In place, as the wrapped lines and CUSTs hold on to the lists
+        counts = [self.line_hits, self.line_time, self.cust_calls, self.cust_time]
+        for count, saved in zip(counts, snapshot):
+            count[:] = saved
+
+    @property
+    def plain_time(self):
+        """Seconds spent in everything but CUSTs"""
+        return sum(self.line_time) - sum(self.cust_time)
+
+    def wrap_line(self, i, line):
+        hits = self.line_hits
+        times = self.line_time
+
+        def profiled_line(asm):
+            start = time.perf_counter()
+            next_pc = line(asm)
+            times[i] += time.perf_counter() - start
+            hits[i] += 1
+            return next_pc
+
+        profiled_line.jumps = line.jumps
+        return profiled_line
+
+    def wrap_cust(self, n, cmd):
+        calls = self.cust_calls
+        times = self.cust_time
+
+        def profiled_cust(asm):
+            start = time.perf_counter()
+            result = cmd(asm)
+            times[n] += time.perf_counter() - start
+            calls[n] += 1
+            return result
+
+        return profiled_cust
+
+
+class InfiniteLoopError(Exception):
+    """A machine got back to a state it had already been in, so never halts"""
+
+    def __init__(self, steps):
+        super().__init__(f"Stuck in a loop after {steps} steps")
+        self.steps = steps
+
+
+class CycleDetector:
+    """Spots a machine going round in circles, from the machine after each step.
+
+    "exact" remembers every state, so catches a loop the first time it comes
+    back round. "brent" only keeps one state at a time, using Brent's
+    algorithm, so might take a couple more trips round the loop.
+    """
+
+    def __init__(self, mode="brent"):
+        assert mode in ["exact", "brent"]
+        self.mode = mode
+        self.seen = set()
+        self.saved = None
+        self.saved_key = None
+        self.power = 1
+        self.count = 0
+
+    def check(self, asm):
+        """Returns True if the machine is in a loop"""
+        if self.mode == "exact":
+            state = asm.state()
+            if state in self.seen:
+                return True
+            self.seen.add(state)
+            return False
+
+        # The whole state takes as long as the stack is deep to build, so only
+        # build it when the cheap parts of it match, or to save it
+        key = (asm.pc, len(asm.stack), asm.num_outputs)
+        if key == self.saved_key and asm.state() == self.saved:
+            return True
+        self.count += 1
+        if self.count == self.power:
+            self.saved = asm.state()
+            self.saved_key = key
+            self.power *= 2
+            self.count = 0
+        return False
+
+
 class Asm:
     @classmethod
     def parse(cls, lines):
@@ -144,84 +458,117 @@ class Asm:
             if type(line) is list:
                 line = "".join(line)
 
-            line = line.rstrip()
-
-            # Blank line -> blank cmd
-            if line == "":
-                cmds.append([])
-                continue
-
-            subcmds = line.lower().split("|")
-
-            ok = True
-            new_subcmds = []
-            for subcmd in subcmds:
-                words = subcmd.strip().split(" ")
-                if len(words) not in [1, 2]:
-                    ok = False
-                    break
-
-                # Validate each word
-                ok2 = True
-                new_words = []
-                for word in words:
-                    if word.isdigit():
-                        literal = int(word)
-                        if 0 <= literal and literal < 2**6:
-                            new_words.append(make_literal_fn(literal))
-                        else:
-                            ok2 = False
-                            break
-                    elif word not in commands:
-                        ok2 = False
-                        break
-                    else:
-                        new_words.append(commands[word])
-                if not ok2:
-                    ok = False
-                    break
+            cmds.append(cls.parse_line(line.rstrip()))
+
+        return cmds
 
-                new_subcmds.append(new_words)
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def parse_line(line):
+        """Parse one stripped line, caching the result.
+
+        The editor re-parses every line on each keystroke, so only lines that
+        actually changed get parsed again. Callers share the returned lists and
+        mustn't modify them.
+        """
+        # Blank line -> blank cmd
+        if line == "":
+            return []
+
+        subcmds = line.lower().split("|")
+
+        new_subcmds = []
+        for subcmd in subcmds:
+            words = subcmd.strip().split(" ")
+            if len(words) not in [1, 2]:
+                return None
+
+            # Validate each word
+            new_words = []
+            for word in words:
+                if word.isdigit():
+                    literal = int(word)
+                    if 0 <= literal and literal < 2**6:
+                        new_words.append(make_literal_fn(literal))
+                    else:
+                        return None
+                elif word not in commands:
+                    return None
+                else:
+                    new_words.append(commands[word])
 
-            if ok:
-                cmds.append(new_subcmds)
-            else:
-                cmds.append(None)
+            new_subcmds.append(new_words)
 
-        return cmds
+        return new_subcmds
 
-    def __init__(self, cmds, ucodes, num_lines):
+    def __init__(self, cmds, ucodes, num_lines, cust="table"):
+        """cust picks how CUST commands run their UCodes, from cust_modes"""
         self.cmds = cmds
+        self.cust = cust
+        self.lines = [
+            None if cmd is None else compile_cmd(cmd, cust=cust) for cmd in cmds
+        ]
         self.ucodes = ucodes
         self.num_lines = num_lines
 
-        self.stack = []
+        self.stack = Stack()
         self.pc = 0
+        self.num_outputs = 0
+        self.profile = None
+
+    def enable_profiling(self):
+        """Start counting into a fresh Profile, kept in self.profile.
+
+        This swaps in instrumented copies of the lines, so an Asm that's never
+        profiled runs exactly as fast as before.
+        """
+        self.profile = Profile(len(self.cmds))
+        overrides = {
+            name: self.profile.wrap_cust(n, cmd)
+            for n, (name, cmd) in enumerate(cust_cmds(self.cust).items())
+        }
+        self.lines = [
+            (
+                None
+                if cmd is None
+                else self.profile.wrap_line(i, compile_cmd(cmd, overrides))
+            )
+            for i, cmd in enumerate(self.cmds)
+        ]
+        return self.profile
+
+    def load_stack(self, values):
+        """Replace the stack with a copy of values, bottom first"""
+        self.stack = Stack(values, self.stack.capacity, self.stack.overflow)
 
     def output(self, val):
+        self.num_outputs += 1
         self.output_callback(self, val)
 
-    def step(self):
-        cmd = self.cmds[self.pc]
-        self.pipe1 = 0
-        self.pipe2 = 0
-        next_pc = self.pc + 1
+    def snapshot(self):
+        """Everything needed to restore() the machine to how it is now.
 
-        for subcmd in cmd:
-            next_pipe1, jump_addr_1 = subcmd[0](self)
-            if len(subcmd) == 2:
-                next_pipe2, jump_addr_2 = subcmd[1](self)
-            else:
-                next_pipe2, jump_addr_2 = 0, None
+        Like state(), this leaves out the pipes. Taking one copies the whole
+        stack, but it's made of tuples, so can be kept and restored any number
+        of times.
+        """
+        return self.pc, self.stack.snapshot(), self.num_outputs
 
-            self.pipe1 = next_pipe1 % 64
-            self.pipe2 = next_pipe2 % 64
+    def restore(self, snapshot):
+        self.pc, stack, self.num_outputs = snapshot
+        self.stack.restore(stack)
 
-            if jump_addr_1 is not None:
-                next_pc = jump_addr_1
+    def state(self):
+        """Everything that decides what the machine does from here on.
 
-            if jump_addr_2 is not None:
-                next_pc = jump_addr_2
+        The pipes aren't included, since every line starts them from 0.
+        """
+        return self.pc, tuple(self.stack), self.num_outputs
+
+    def step(self):
+        next_pc = self.lines[self.pc](self)
+        if next_pc is None:
+            next_pc = self.pc + 1
 
         if self.num_lines <= next_pc:
             self.pc = 0
@@ -230,9 +577,48 @@ class Asm:
         self.pc = next_pc
         return True
 
-    def run(self):
-        while self.step():
-            pass
+    def run(self, max_steps=None, detect_cycles=None):
+        """Run until the program ends, and return True.
+
+        Returns False if max_steps run out first. If detect_cycles is "exact"
+        or "brent", raises InfiniteLoopError once the program is found to be
+        going round in circles (see CycleDetector).
+        """
+        if max_steps is not None or detect_cycles is not None:
+            detector = CycleDetector(detect_cycles) if detect_cycles else None
+            steps = 0
+            while self.step():
+                steps += 1
+                if detector is not None and detector.check(self.state()):
+                    raise InfiniteLoopError(steps)
+                if max_steps is not None and max_steps <= steps:
+                    return False
+            return True
+
+        if (
+            self.profile is None
+            and self.cust == "table"
+            and None not in self.cmds
+            and len(self.cmds) <= self.num_lines
+        ):
+            # Blank lines after the last one that does anything are skipped,
+            # which is the same as running them
+            compile_program(self.cmds)(self, float("inf"), None)
+            self.pc = 0
+            return True
+
+        lines = self.lines
+        num_lines = self.num_lines
+        while True:
+            next_pc = lines[self.pc](self)
+            if next_pc is None:
+                next_pc = self.pc + 1
+
+            if num_lines <= next_pc:
+                self.pc = 0
+                return True
+
+            self.pc = next_pc
 
 
 if __name__ == "__main__":
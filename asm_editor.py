@@ -1,7 +1,15 @@
+from itertools import islice
+
 from asm import Asm, asm_ref_sheet
+from grader import PuzzleRun
 from nano_editor import NanoEditor, outline_editor, chars_to_bools, bools_to_chars
+from screen import screen_of
+from ucode import UCode
 from ucode_editor import UcodeEditor
 
+# How the stack and output panes show each 6-bit value
+_dec_bin = [f"{val:>02} {val:>06b}" for val in range(64)]
+
 
 class AsmEditor:
     def __init__(self, term, esc_delay, puzzle):
@@ -13,15 +21,31 @@ class AsmEditor:
         self.CODE_HEIGHT = 32
         self.STACK_WIDTH = 9
         self.STACK_HEIGHT = 32
+        # Steps between execution snapshots, and steps per UP/DOWN when scrubbing
+        self.SNAPSHOT_EVERY = 64
+        self.SCRUB_STEPS = 100
+        # Execution speeds, as (label, steps per frame, seconds per frame). MAX
+        # runs as many steps as fit in a frame, and only stops to redraw.
+        self.SPEEDS = [
+            ("5 HZ", 1, 0.2),
+            ("x10", 10, 0.05),
+            ("x100", 100, 0.05),
+            ("MAX", None, 0.05),
+        ]
+        self.speed = 0
 
         self.stack_editor = NanoEditor(
             term, (1, 1), (self.STACK_WIDTH, self.STACK_HEIGHT)
         )
         self.stack_editor.is_focused = False
+        # The values on the rows of the stack and output panes, so that only
+        # rows that change get formatted again
+        self.stack_shown = []
+        self.output_shown = []
 
         # Fill the stack
         self.asm = Asm(Asm.parse([]), [], self.CODE_HEIGHT)
-        self.asm.stack = self.puzzle[2][0].copy()
+        self.asm.load_stack(self.puzzle[2][0])
         self._fill_stack_editor()
 
         self.code_editor = NanoEditor(
@@ -53,17 +77,22 @@ class AsmEditor:
             y = 1 + 4 * i + (0 if i < 3 else 2)
             editor = NanoEditor(self.term, (x, y), (7, 1))
             editor.is_focused = False
-            editor.contents = "EDIT" if i < 3 else ""
+            editor.contents = "EDIT" if i < 3 else self.SPEEDS[self.speed][0]
             editor.contents = [list(editor.contents)]
 
             self.left_buttons.append(editor)
 
-        self.ucode_sub_editors = [UcodeEditor(self.term) for _ in range(3)]
+        # Each CUST's editor is made when it's first opened
+        self.ucode_sub_editors = [None] * 3
 
-        self.output = []
+        self.run = None
+        self.show_heat = False
         self.cursor = [0, 0]
         self.is_editing = False
         self.is_executing = False
+        self.is_paused = False
+        # Title of the result shown over a finished run, until the next key
+        self.result = None
 
     def _parse(self):
         cmds = Asm.parse(self.code_editor.contents)
@@ -71,96 +100,167 @@ class AsmEditor:
             i for i, cmd in enumerate(cmds) if cmd is None
         ]
         if len(self.code_editor.highlighted_lines) == 0:
-            self.left_buttons[-1].contents = [list("")]
+            label = [list(self.SPEEDS[self.speed][0])]
         else:
-            self.left_buttons[-1].contents = [list("FIX ERR")]
+            label = [list("FIX ERR")]
+
+        if self.left_buttons[-1].contents != label:
+            self.left_buttons[-1].contents = label
+            self._draw_button(len(self.left_buttons) - 1)
 
     def _num_to_dec_bin(self, val):
+        if 0 <= val < 64:
+            return _dec_bin[val]
         return f"{val:>02} {val:>06b}"
 
+    def _fill_rows(self, editor, shown, values):
+        """Show values on the editor's rows, reformatting only rows that changed"""
+        del shown[len(values) :]
+        del editor.contents[len(shown) :]
+        for y, val in enumerate(values):
+            if y == len(shown):
+                shown.append(val)
+                editor.contents.append(list(self._num_to_dec_bin(val)))
+            elif shown[y] != val:
+                shown[y] = val
+                editor.contents[y] = list(self._num_to_dec_bin(val))
+
     def _fill_stack_editor(self):
-        self.stack_editor.contents = [
-            list(self._num_to_dec_bin(val)) for val in self.asm.stack
-        ]
-        self.stack_editor.contents.reverse()
-        # self.stack_editor.contents = self.stack_editor.contents + [[]] * ( self.stack_editor.size[1] - len(self.asm.stack))
+        # Top of the stack first, and only as much as fits
+        top = list(islice(reversed(self.asm.stack), self.STACK_HEIGHT))
+        self._fill_rows(self.stack_editor, self.stack_shown, top)
+
+    def _fill_output_editor(self):
+        # Outputs are only ever added to, or taken back when scrubbing
+        first = self.run.output[: self.STACK_HEIGHT]
+        self._fill_rows(self.output_editor, self.output_shown, first)
 
     def _begin_execution(self):
         if len(self.code_editor.highlighted_lines) != 0:
             return
 
-        def output_callback(_, val):
-            self.output.append(val)
-            self.output_editor.contents = [
-                list(self._num_to_dec_bin(val)) for val in self.output
-            ]
-
-        ucodes = [editor.ucode for editor in self.ucode_sub_editors]
-        self.asm = Asm(Asm.parse(self.code_editor.contents), ucodes, self.CODE_HEIGHT)
-        self.asm.output_callback = output_callback
+        # A CUST that's never been opened has no code
+        ucodes = [
+            UCode([]) if editor is None else editor.ucode
+            for editor in self.ucode_sub_editors
+        ]
+        self.run = PuzzleRun(
+            self.puzzle,
+            self.code_editor.contents,
+            ucodes,
+            profile=self.show_heat,
+            snapshot_every=self.SNAPSHOT_EVERY,
+            # Runs are short, so only work out the CUST results they need
+            cust="cached",
+        )
+        self.asm = self.run.asm
 
-        total_steps = 0
-        test_case = 0
-        self.asm.stack = self.puzzle[2][test_case].copy()
-        self.output = []
         self.is_executing = True
-        while self.is_executing:
-            with self.term.cbreak(), self.term.hidden_cursor():
-                inp = self.term.inkey(esc_delay=self.esc_delay, timeout=0.2)
-            if inp.code == self.term.KEY_ESCAPE:
-                self.is_executing = False
-                self.draw()
-                break
-
-            self.asm.step()
-            self._fill_stack_editor()
-
-            # Check for success, even when the prog is not in the process of finishing, beucase that way the
-            # machine doesn't have to know when to stop.
-            success = self.output == self.puzzle[3][test_case]
-            if success:
-                if len(self.puzzle[3]) <= test_case + 1:
-                    win_editor = NanoEditor(self.term, (30, 8), (32, 4))
-                    win_editor.is_focused = False
-                    win_editor.contents = [
-                        "Your code took " + str(total_steps) + " steps, and",
-                        "passed all of the test cases.",
-                    ]
-                    win_editor.contents = [list(line) for line in win_editor.contents]
-                    outline_editor(
-                        self.term,
-                        win_editor,
-                        title="SUCCESS!",
-                        color=self.term.black_on_green,
-                    )
-                    win_editor.draw()
-                    with self.term.cbreak(), self.term.hidden_cursor():
-                        _ = self.term.inkey(esc_delay=self.esc_delay)
-                    self.is_executing = False
-                    self.draw()
-                    break
-                else:
-                    # Reset and start again!
-                    test_case += 1
-                    self.asm.stack = self.puzzle[2][test_case].copy()
-                    self.asm.pc = 0
-                    self.output = []
+        self.is_paused = False
+        self._fill_stack_editor()
+        self._fill_output_editor()
+        self.draw()
+
+    def tick(self):
+        """Run the next frame of the program, if it's running.
+
+        Returns the seconds until the next frame is due, or None if there's
+        nothing to run until a key is pressed.
+        """
+        if not self.is_executing or self.is_paused or self.result is not None:
+            return None
+
+        _, steps_per_frame, frame_time = self.SPEEDS[self.speed]
+        if steps_per_frame is None:
+            self.run.run(timeout=frame_time)
+        else:
+            self.run.run(self.run.total_steps + steps_per_frame)
+        self._show_progress(self.run.passed is None)
+
+        # Running flat out, the next frame can start as soon as keys are seen to
+        return 0 if steps_per_frame is None else frame_time
+
+    def _execution_keypress(self, inp):
+        # Any key closes the result, and ESC stops the program
+        if self.result is not None or inp.code == self.term.KEY_ESCAPE:
+            self.is_executing = False
+            self.result = None
+            self.draw()
+            return
+
+        # SPACE pauses, and the arrow keys scrub backwards and forwards
+        if inp == " ":
+            self.is_paused = not self.is_paused
+            return
+        elif inp.lower() == "s":
+            self._next_speed()
+            return
+        elif inp.code == self.term.KEY_LEFT:
+            self.is_paused = True
+            running = self.run.step_back()
+        elif inp.code == self.term.KEY_UP:
+            self.is_paused = True
+            running = self.run.seek(self.run.total_steps - self.SCRUB_STEPS)
+        elif inp.code == self.term.KEY_DOWN:
+            self.is_paused = True
+            running = self.run.seek(self.run.total_steps + self.SCRUB_STEPS)
+        elif inp.code == self.term.KEY_RIGHT:
+            running = self.run.step()
+        else:
+            return
+        self._show_progress(running)
+
+    def _show_progress(self, running):
+        """Draw the machine after some steps, and the result once it's done"""
+        self._fill_stack_editor()
+        self._fill_output_editor()
+        self.draw()
 
-            if self.CODE_HEIGHT <= self.asm.pc or all(
+        if self.run.passed:
+            self._show_result(
+                "SUCCESS!",
                 [
-                    "".join(line).strip() == ""
-                    for line in self.code_editor.contents[self.asm.pc :]
-                ]
-            ):
-                self.is_executing = False
-                self.draw()
-                break
-
-            total_steps += 1
+                    "Your code took " + str(self.run.total_steps) + " steps, and",
+                    "passed all of the test cases.",
+                ],
+                self.term.black_on_green,
+            )
+        elif self.run.wrong_output is not None:
+            step, line = self.run.wrong_output
+            output, expected = self.run.output, self.run.expected
+            i = 0
+            while i < len(expected) and output[i] == expected[i]:
+                i += 1
+            wanted = str(expected[i]) if i < len(expected) else "nothing"
+            self._show_result(
+                "WRONG OUTPUT",
+                [
+                    f"Line {line} output {output[i]} on step {step},",
+                    f"but test case {self.run.test_case + 1} wanted {wanted}.",
+                ],
+                self.term.black_on_red,
+            )
+        elif not running:
+            self.is_executing = False
             self.draw()
 
+    def _next_speed(self):
+        self.speed = (self.speed + 1) % len(self.SPEEDS)
+        # The EXECUTE button shows the speed
+        self._parse()
+
+    def _show_result(self, title, lines, color):
+        """Pop up a box over everything, until the next key"""
+        self.result = title
+        win_editor = NanoEditor(self.term, (30, 8), (36, len(lines) + 2))
+        win_editor.is_focused = False
+        win_editor.contents = [list(line) for line in lines]
+        outline_editor(self.term, win_editor, title=title, color=color)
+        win_editor.draw()
+
     def draw(self):
-        print(self.term.clear)
+        screen = screen_of(self.term)
+        screen.clear()
 
         if self.is_editing or self.is_executing:
             outline_colors = self.term.white_on_black, self.term.black_on_white
@@ -193,34 +293,54 @@ class AsmEditor:
         )
         self.info_editor.draw()
 
-        for i, button in enumerate(self.left_buttons):
-            title = ["CUST1", "CUST2", "CUST3", "EXECUTE"][i]
-            outline_editor(
-                self.term,
-                button,
-                title=title,
-                color=outline_colors[self.cursor == [1, i]],
-            )
-            button.draw()
+        for i in range(len(self.left_buttons)):
+            self._draw_button(i)
 
         # Draw the execution arrow
         if self.is_executing:
             arrow_y = self.asm.pc + 1
         else:
             arrow_y = 1
-        print(
-            self.term.move_xy(self.STACK_WIDTH + 4, arrow_y)
-            + self.term.red_on_black("→")
-        )
+        screen.write(self.STACK_WIDTH + 4, arrow_y, "→", self.term.red_on_black)
 
         # Line numbers
         for y in range(self.CODE_HEIGHT):
             if y + 1 != arrow_y:
-                print(
-                    self.term.move_xy(self.STACK_WIDTH + 3, y + 1)
-                    + self.term.white_on_black(str(y))
+                screen.write(
+                    self.STACK_WIDTH + 3, y + 1, str(y), self.term.white_on_black
                 )
 
+        if self.show_heat:
+            self._draw_heat()
+
+    def _draw_heat(self):
+        """Shade the column left of the line numbers by how often each line ran"""
+        if self.run is None or self.run.asm.profile is None:
+            hits = [0] * self.CODE_HEIGHT
+        else:
+            hits = self.run.asm.profile.line_hits
+        shades = " ░▒▓█"
+        most = max(hits) or 1
+        screen = screen_of(self.term)
+        for y, count in enumerate(hits[: self.CODE_HEIGHT]):
+            shade = shades[-(-count * (len(shades) - 1) // most)]
+            screen.write(self.STACK_WIDTH + 2, y + 1, shade, self.term.red_on_black)
+
+    def _draw_button(self, i):
+        if self.is_editing or self.is_executing:
+            outline_colors = self.term.white_on_black, self.term.black_on_white
+        else:
+            outline_colors = self.term.green_on_black, self.term.black_on_green
+
+        title = ["CUST1", "CUST2", "CUST3", "EXECUTE"][i]
+        outline_editor(
+            self.term,
+            self.left_buttons[i],
+            title=title,
+            color=outline_colors[self.cursor == [1, i]],
+        )
+        self.left_buttons[i].draw()
+
     @property
     def _highlighted_editor(self):
         if self.cursor[0] == 0:
@@ -228,7 +348,18 @@ class AsmEditor:
         else:
             return self.left_buttons[self.cursor[1]]
 
+    def _ucode_editor(self):
+        """The editor for the CUST under the cursor, made if it's not yet"""
+        i = self.cursor[1]
+        if self.ucode_sub_editors[i] is None:
+            self.ucode_sub_editors[i] = UcodeEditor(self.term)
+        return self.ucode_sub_editors[i]
+
     def keypress(self, inp):
+        if self.is_executing:
+            self._execution_keypress(inp)
+            return True
+
         do_draw = True
         if self.is_editing:
             if self.cursor[0] == 0:
@@ -236,10 +367,11 @@ class AsmEditor:
                     self.is_editing = False
                     self._highlighted_editor.is_focused = False
                 else:
+                    # The editor redraws itself, and _parse the EXECUTE button
                     self._highlighted_editor.keypress(inp)
+                    do_draw = False
             else:
-                editor = self.ucode_sub_editors[self.cursor[1]]
-                self.is_editing = editor.keypress(inp)
+                self.is_editing = self._ucode_editor().keypress(inp)
                 do_draw = not self.is_editing
         else:
             if inp.code == self.term.KEY_ESCAPE:
@@ -252,8 +384,12 @@ class AsmEditor:
                     self._begin_execution()
                 else:
                     self.is_editing = True
-                    self.ucode_sub_editors[self.cursor[1]].draw()
+                    self._ucode_editor().draw()
                     do_draw = False
+            elif inp.lower() == "h":
+                self.show_heat = not self.show_heat
+            elif inp.lower() == "s":
+                self._next_speed()
             elif inp.code == self.term.KEY_LEFT:
                 if 0 < self.cursor[0]:
                     self.cursor[0] -= 1
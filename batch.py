@@ -0,0 +1,386 @@
+import argparse
+import random
+import sys
+
+import numpy as np
+
+from asm import Asm, command_names
+from grader import find_puzzle, load_program, read_lines
+
+# What each lane of a BatchAsm is doing
+RUNNING, PASSED, ENDED, WRONG_OUTPUT, OVERFLOWED = range(5)
+status_names = ["running", "passed", "ended", "wrong output", "overflowed"]
+
+
+class BatchAsm:
+    """One Asm program running on many input stacks at once, a lane per stack.
+
+    Each lane has its own pc, stack and output, held in NumPy arrays. A step
+    runs each line that some lane is on, for just those lanes, and CUSTs look
+    up their UCodes' tables. With expected outputs, a lane passes as soon as
+    its output matches, as in PuzzleRun, and stops as soon as it never can.
+    Stacks hold at most depth entries and outputs max_outputs, and a lane
+    that needs more stops as overflowed.
+    """
+
+    def __init__(
+        self,
+        cmds,
+        ucodes,
+        stacks,
+        expected=None,
+        num_lines=32,
+        depth=64,
+        max_outputs=64,
+    ):
+        assert None not in cmds
+        self.cmds = cmds
+        self.ucodes = ucodes
+        self.num_lines = num_lines
+        # Landing after the last non-blank line ends the program
+        self.end = max([i + 1 for i, cmd in enumerate(cmds) if cmd], default=0)
+        self._tables = {}
+
+        lanes = len(stacks)
+        self.depth = depth
+        # Each stack is a ring buffer, from base up to base + size
+        self.stack = np.zeros((lanes, depth), np.int64)
+        self.base = np.zeros(lanes, np.int64)
+        self.size = np.zeros(lanes, np.int64)
+        for lane, values in enumerate(stacks):
+            if depth < len(values):
+                raise ValueError(f"Stack {lane} has more than {depth} entries")
+            self.stack[lane, : len(values)] = values
+            self.size[lane] = len(values)
+
+        self.outputs = np.zeros((lanes, max_outputs), np.int64)
+        self.num_outputs = np.zeros(lanes, np.int64)
+        self.expected = None
+        if expected is not None:
+            # Padded with -1, which never matches
+            self.expected = np.full((lanes, max_outputs), -1, np.int64)
+            self.expected_len = np.zeros(lanes, np.int64)
+            for lane, values in enumerate(expected):
+                if max_outputs < len(values):
+                    raise ValueError(f"Output {lane} has more than {max_outputs}")
+                self.expected[lane, : len(values)] = values
+                self.expected_len[lane] = len(values)
+
+        self.pc = np.zeros(lanes, np.int64)
+        self.steps = np.zeros(lanes, np.int64)
+        self.status = np.full(lanes, RUNNING, np.int8)
+
+    def output(self, lane):
+        return [int(val) for val in self.outputs[lane, : self.num_outputs[lane]]]
+
+    def stack_of(self, lane):
+        """A lane's stack, bottom first"""
+        positions = (self.base[lane] + np.arange(self.size[lane])) % self.depth
+        return [int(val) for val in self.stack[lane, positions]]
+
+    def step(self):
+        """Run one line on every running lane. Returns False once none are."""
+        live = np.flatnonzero(self.status == RUNNING)
+        if len(live) == 0:
+            return False
+
+        pcs = self.pc[live]
+        for i in np.unique(pcs):
+            self._run_line(int(i), live[pcs == i])
+        self._after_step(live)
+        return bool(np.any(self.status == RUNNING))
+
+    def run(self, max_steps=10000):
+        """Step until no lane is running, or max_steps steps have run.
+
+        Lanes still running at the end are left RUNNING.
+        """
+        steps = 0
+        while self.step():
+            steps += 1
+            if max_steps <= steps:
+                break
+
+    def _after_step(self, lanes):
+        # The same checks as PuzzleRun makes after each step
+        lanes = lanes[self.status[lanes] == RUNNING]
+        if self.expected is not None:
+            # Wrong outputs have already stopped their lanes
+            passed = self.num_outputs[lanes] == self.expected_len[lanes]
+            self.status[lanes[passed]] = PASSED
+            lanes = lanes[~passed]
+        ended = self.end <= self.pc[lanes]
+        self.status[lanes[ended]] = ENDED
+        self.steps[lanes[~ended]] += 1
+
+    def _stop(self, lanes, status):
+        lanes = lanes[self.status[lanes] == RUNNING]
+        self.status[lanes] = status
+
+    def _run_line(self, addr, lanes):
+        cmd = self.cmds[addr] if addr < len(self.cmds) else []
+        zeros = np.zeros(len(lanes), np.int64)
+        next_pc = np.full(len(lanes), -1, np.int64)
+
+        pipes = [zeros, zeros]
+        for subcmd in cmd:
+            values = [
+                self._run_word(word, lanes, pipes, next_pc, addr) for word in subcmd
+            ]
+            if len(values) == 1:
+                values.append(zeros)
+            pipes = values
+
+        next_pc = np.where(next_pc < 0, addr + 1, next_pc)
+        next_pc[self.num_lines <= next_pc] = 0
+        self.pc[lanes] = next_pc
+
+    def _run_word(self, word, lanes, pipes, next_pc, addr):
+        p1, p2 = pipes
+        if hasattr(word, "literal"):
+            return np.full(len(lanes), word.literal, np.int64)
+
+        name = command_names[word]
+        if name == "add":
+            return (p1 + p2) % 64
+        elif name == "sub":
+            return (p1 - p2) % 64
+        elif name == "first":
+            return p1
+        elif name == "second":
+            return p2
+        elif name == "jmp":
+            next_pc[:] = p1
+            return p1
+        elif name == "jmpzero":
+            zero = p2 == 0
+            next_pc[zero] = p1[zero]
+            return p1
+        elif name == "push":
+            self._push(lanes, p1)
+            return p1
+        elif name == "pop":
+            return self._pop(lanes)
+        elif name == "swap":
+            self._swap(lanes)
+            return p1
+        elif name == "append":
+            self._append_bottom(lanes, p1)
+            return p1
+        elif name == "output":
+            self._output(lanes, p1)
+            return p1
+
+        # A CUST always sets the jump, which is the next line by default
+        entries = self._table(int(name[-1]) - 1)[(p1 << 12) | (p2 << 6) | addr]
+        next_pc[:] = entries >> 8
+        return entries & 255
+
+    def _table(self, n):
+        if n not in self._tables:
+            table = np.frombuffer(self.ucodes[n].table, np.uint16)
+            self._tables[n] = table.astype(np.int64)
+        return self._tables[n]
+
+    def _push(self, lanes, values):
+        full = self.depth <= self.size[lanes]
+        self._stop(lanes[full], OVERFLOWED)
+        lanes, values = lanes[~full], values[~full]
+        self.stack[lanes, (self.base[lanes] + self.size[lanes]) % self.depth] = values
+        self.size[lanes] += 1
+
+    def _append_bottom(self, lanes, values):
+        full = self.depth <= self.size[lanes]
+        self._stop(lanes[full], OVERFLOWED)
+        lanes, values = lanes[~full], values[~full]
+        self.base[lanes] = (self.base[lanes] - 1) % self.depth
+        self.stack[lanes, self.base[lanes]] = values
+        self.size[lanes] += 1
+
+    def _pop(self, lanes):
+        size = self.size[lanes]
+        nonempty = 0 < size
+        top = (self.base[lanes] + size - 1) % self.depth
+        values = np.where(nonempty, self.stack[lanes, top], 0)
+        self.size[lanes] = size - nonempty
+        return values
+
+    def _swap(self, lanes):
+        # As if the stack had 0s below the bottom
+        size = self.size[lanes]
+        short = size < 2
+        self._push(lanes[short], np.zeros(np.count_nonzero(short), np.int64))
+        empty = size == 0
+        self._push(lanes[empty], np.zeros(np.count_nonzero(empty), np.int64))
+
+        lanes, size = lanes[~short], size[~short]
+        top = (self.base[lanes] + size - 1) % self.depth
+        below = (top - 1) % self.depth
+        self.stack[lanes, top], self.stack[lanes, below] = (
+            self.stack[lanes, below],
+            self.stack[lanes, top],
+        )
+
+    def _output(self, lanes, values):
+        count = self.num_outputs[lanes]
+        full = self.outputs.shape[1] <= count
+        self._stop(lanes[full], OVERFLOWED)
+        lanes, values, count = lanes[~full], values[~full], count[~full]
+        self.outputs[lanes, count] = values
+        self.num_outputs[lanes] += 1
+        if self.expected is not None:
+            # Output is never taken back, so one wrong value means no pass
+            wrong = self.expected[lanes, count] != values
+            self._stop(lanes[wrong], WRONG_OUTPUT)
+
+
+# Random test cases for each puzzle, as (stack, expected output). Stacks are
+# bottom first, so programs see the inputs from the end.
+
+
+def _count_to_10(rng):
+    return [], list(range(1, 11))
+
+
+def _power_of_2(rng):
+    inputs = [rng.randrange(6) for _ in range(rng.randint(1, 8))]
+    return inputs, [2**n for n in reversed(inputs)]
+
+
+def _sum(rng):
+    sets = [
+        [rng.randint(1, 20) for _ in range(rng.randint(1, 3))]
+        for _ in range(rng.randint(1, 4))
+    ]
+    inputs = []
+    for values in sets:
+        inputs += values + [0]
+    return inputs[::-1], [sum(values) for values in sets]
+
+
+def _mod_8(rng):
+    inputs = [rng.randrange(64) for _ in range(rng.randint(1, 8))]
+    return inputs, [n % 8 for n in reversed(inputs)]
+
+
+def _square(rng):
+    inputs = [rng.randrange(8) for _ in range(rng.randint(1, 8))]
+    return inputs, [n * n for n in reversed(inputs)]
+
+
+def _compare(rng):
+    pairs = [(rng.randrange(64), rng.randrange(64)) for _ in range(rng.randint(1, 5))]
+    inputs = [n for pair in pairs for n in pair]
+    return inputs[::-1], [int(first < second) for first, second in pairs]
+
+
+def _mod(rng):
+    pairs = [(rng.randint(1, 63), rng.randrange(64)) for _ in range(rng.randint(1, 4))]
+    inputs = [n for pair in pairs for n in pair]
+    return inputs[::-1], [second % first for first, second in pairs]
+
+
+def _sort(rng):
+    inputs = rng.sample(range(10), rng.randint(1, 10))
+    return inputs, sorted(inputs)
+
+
+def _prime(rng):
+    inputs = [rng.randint(2, 63) for _ in range(rng.randint(1, 8))]
+    return inputs, [int(all(n % d for d in range(2, n))) for n in reversed(inputs)]
+
+
+case_generators = {
+    "COUNT TO 10": _count_to_10,
+    "POWER OF 2": _power_of_2,
+    "SUM": _sum,
+    "MOD 8": _mod_8,
+    "SQUARE": _square,
+    "COMPARE": _compare,
+    "MOD": _mod,
+    "SORT": _sort,
+    "PRIME": _prime,
+}
+
+
+def fuzz(puzzle, code_lines, ucode_lines, count=1000, max_steps=10000, seed=None):
+    """Run a program on count random test cases of a puzzle, all at once.
+
+    Takes lines of text as for load_program. Returns the finished BatchAsm
+    and the test cases, as (stack, expected output) pairs in lane order.
+    """
+    rng = random.Random(seed)
+    cases = [case_generators[puzzle[0]](rng) for _ in range(count)]
+    code_lines, ucodes = load_program(code_lines, ucode_lines)
+    batch = BatchAsm(
+        Asm.parse(code_lines),
+        ucodes,
+        [stack for stack, _ in cases],
+        [expected for _, expected in cases],
+    )
+    batch.run(max_steps)
+    return batch, cases
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Check a solution against many random test cases of a puzzle."
+    )
+    parser.add_argument("puzzle", help="puzzle number (1-9) or title")
+    parser.add_argument(
+        "paths",
+        nargs="+",
+        metavar="path",
+        help="Deep Assembly program file followed by Deeper Microcode files for "
+        "CUST1, CUST2, CUST3",
+    )
+    parser.add_argument(
+        "--count",
+        type=int,
+        default=1000,
+        help="test cases to try (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--max-steps",
+        type=int,
+        default=10000,
+        help="give up on a test case after this many steps (default: %(default)s)",
+    )
+    parser.add_argument("--seed", type=int, default=None, help="random seed")
+    args = parser.parse_args(argv)
+    if 4 < len(args.paths):
+        parser.error("at most three CUST files")
+
+    try:
+        puzzle = find_puzzle(args.puzzle)
+        batch, cases = fuzz(
+            puzzle,
+            read_lines(args.paths[0]),
+            [read_lines(path) for path in args.paths[1:]],
+            args.count,
+            args.max_steps,
+            args.seed,
+        )
+    except (OSError, ValueError) as e:
+        print("ERROR:", e)
+        return 2
+
+    failed = np.flatnonzero(batch.status != PASSED)
+    for lane in failed[:10]:
+        stack, expected = cases[lane]
+        print(
+            f"FAIL stack {stack}: expected {expected}, got {batch.output(lane)} "
+            f"({status_names[batch.status[lane]]} after {batch.steps[lane]} steps)"
+        )
+    if len(failed):
+        print(f"FAIL {puzzle[0]}: {len(failed)} of {len(cases)} test cases")
+        return 1
+    print(
+        f"PASS {puzzle[0]}: {len(cases)} test cases, "
+        f"{batch.steps.mean():.1f} steps on average"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
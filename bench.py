@@ -0,0 +1,216 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import timeit
+
+from asm import Asm, run_ucode_as_cmd
+from grader import NUM_LINES, PuzzleRun, load_program, read_submission
+from puzzle_list import puzzles
+from ucode import UCode
+from uint import Uint6, UintN
+
+SOLUTIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "solutions")
+
+# What game.py does up to its first frame, for a fresh interpreter to run
+STARTUP = """
+import game
+from puzzle_list import PuzzleList
+
+PuzzleList(game.term, game.esc_delay).draw()
+game.screen.flush()
+"""
+
+
+def solution_dir(puzzle):
+    """Where the reference solution to a puzzle lives, e.g. solutions/mod_8"""
+    return os.path.join(SOLUTIONS_DIR, puzzle[0].lower().replace(" ", "_"))
+
+
+def load_solutions():
+    """Each puzzle with its reference solution, as code lines and UCodes"""
+    return [
+        (puzzle, *load_program(*read_submission(solution_dir(puzzle))))
+        for puzzle in puzzles
+    ]
+
+
+def best_rate(fn, count, repeat):
+    """How many of count (the work done by one call of fn) get done a second.
+
+    Takes the best of repeat timings, each long enough to measure.
+    """
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return count * number / min(timer.repeat(repeat, number))
+
+
+def _stepper(code_lines, ucodes, steps):
+    asm = Asm(Asm.parse(code_lines), ucodes, NUM_LINES)
+    asm.output_callback = lambda asm, val: None
+
+    def fn():
+        for _ in range(steps):
+            asm.step()
+
+    return fn
+
+
+def micro_benchmarks(solutions):
+    """(name, fn, count, unit) for each microbenchmark"""
+    by_title = {
+        puzzle[0]: (code_lines, ucodes) for puzzle, code_lines, ucodes in solutions
+    }
+    # Parse the lines as written, since load_program pads the programs with
+    # blank lines, which would mostly be parse cache hits
+    submissions = [read_submission(solution_dir(puzzle)) for puzzle in puzzles]
+    asm_lines = [line for code_lines, _ in submissions for line in code_lines]
+    ucode_lines = [
+        line for _, custs in submissions for lines in custs for line in lines
+    ]
+
+    def parse_asm():
+        Asm.parse_line.cache_clear()
+        Asm.parse(asm_lines)
+
+    def parse_ucode():
+        UCode.parse_line.cache_clear()
+        UCode.parse(ucode_lines)
+
+    # COUNT TO 10 and POWER OF 2 never stop, so can be stepped forever
+    step_plain = _stepper(*by_title["COUNT TO 10"], 1000)
+    step_cust = _stepper(*by_title["POWER OF 2"], 1000)
+
+    asm = Asm([], by_title["MOD"][1], NUM_LINES)
+    asm.pipe1, asm.pipe2 = 13, 50
+    ucode = asm.ucodes[0]
+
+    number = Uint6(37)
+    bits = number.bits()
+
+    return [
+        ("Asm.parse", parse_asm, len(asm_lines), "lines/s"),
+        ("UCode.parse", parse_ucode, len(ucode_lines), "lines/s"),
+        ("Asm.step", step_plain, 1000, "steps/s"),
+        ("Asm.step with CUST", step_cust, 1000, "steps/s"),
+        ("run_ucode_as_cmd", lambda: run_ucode_as_cmd(asm, ucode), 1, "calls/s"),
+        ("UintN.bits", number.bits, 1, "calls/s"),
+        ("UintN.from_bits", lambda: UintN.from_bits(bits), 1, "calls/s"),
+    ]
+
+
+def startup_benchmarks():
+    """(name, fn, count, unit) for starting the game, up to its first frame.
+
+    Each call starts a new interpreter, so imports are timed too.
+    """
+
+    def start():
+        subprocess.run(
+            [sys.executable, "-c", STARTUP],
+            cwd=os.path.dirname(SOLUTIONS_DIR),
+            stdout=subprocess.DEVNULL,
+            check=True,
+        )
+
+    return [("startup", start, 1, "starts/s")]
+
+
+def solution_benchmarks(solutions, cust):
+    """(name, fn, count, unit) for running each reference solution.
+
+    Each call sets up a PuzzleRun and runs it to the end, as the grader does.
+    Raises ValueError if a solution doesn't pass.
+    """
+    benchmarks = []
+    for puzzle, code_lines, ucodes in solutions:
+        # A first run also builds any CUST tables, which later runs reuse
+        run = PuzzleRun(puzzle, code_lines, ucodes, cust=cust)
+        run.run()
+        if not run.passed:
+            raise ValueError(f"The reference solution to {puzzle[0]} fails")
+
+        def fn(puzzle=puzzle, code_lines=code_lines, ucodes=ucodes):
+            PuzzleRun(puzzle, code_lines, ucodes, cust=cust).run()
+
+        benchmarks.append((puzzle[0], fn, run.total_steps, "steps/s"))
+    return benchmarks
+
+
+def run_benchmarks(benchmarks, repeat, baseline=None):
+    """Time each benchmark, printing results as they come, and return them.
+
+    With baseline (results from an earlier run), also show how each rate
+    compares.
+    """
+    results = {}
+    for name, fn, count, unit in benchmarks:
+        rate = best_rate(fn, count, repeat)
+        results[name] = {"rate": rate, "unit": unit}
+
+        line = f"{name:<20} {rate:>14,.0f} {unit}"
+        if baseline is not None and name in baseline:
+            line += f"  ({rate / baseline[name]['rate']:.2f}x)"
+        print(line, flush=True)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Time the engine on microbenchmarks and the reference "
+        "solutions in solutions/."
+    )
+    parser.add_argument(
+        "--json", metavar="PATH", help="save the results to PATH as JSON"
+    )
+    parser.add_argument(
+        "--compare",
+        metavar="PATH",
+        help="show how each result compares to one saved with --json",
+    )
+    parser.add_argument(
+        "--cust",
+        choices=["table", "cached", "run"],
+        default="table",
+        help="how the solutions run CUSTs, as for grader.py (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="time each benchmark this many times and keep the best "
+        "(default: %(default)s)",
+    )
+    parser.add_argument(
+        "--skip-micro", action="store_true", help="skip the microbenchmarks"
+    )
+    parser.add_argument(
+        "--skip-startup", action="store_true", help="skip timing startup"
+    )
+    args = parser.parse_args(argv)
+
+    baseline = None
+    try:
+        if args.compare is not None:
+            with open(args.compare) as f:
+                baseline = json.load(f)["results"]
+        solutions = load_solutions()
+        benchmarks = solution_benchmarks(solutions, args.cust)
+    except (OSError, ValueError, KeyError) as e:
+        print("ERROR:", e)
+        return 2
+    if not args.skip_micro:
+        benchmarks = micro_benchmarks(solutions) + benchmarks
+    if not args.skip_startup:
+        benchmarks = startup_benchmarks() + benchmarks
+
+    results = run_benchmarks(benchmarks, args.repeat, baseline)
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump({"cust": args.cust, "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+import random
+
+import pytest
+
+ASM_WORDS = [
+    "add",
+    "sub",
+    "first",
+    "second",
+    "jmp",
+    "jmpzero",
+    "push",
+    "pop",
+    "swap",
+    "append",
+    "output",
+    "cust1",
+    "cust2",
+    "cust3",
+]
+GATE_ARGS = {
+    "buf": 1,
+    "not": 1,
+    "and": 2,
+    "or": 2,
+    "nand": 2,
+    "nor": 2,
+    "xor": 2,
+    "xnor": 2,
+    "if": 3,
+}
+
+
+@pytest.fixture
+def rng():
+    return random.Random(1234)
+
+
+@pytest.fixture
+def random_asm(rng):
+    """Makes random Asm programs, as lines of text padded to 32 lines"""
+
+    def word():
+        # Low literals, so that jumps mostly land inside the program
+        if rng.random() < 0.35:
+            return str(rng.randrange(16))
+        return rng.choice(ASM_WORDS)
+
+    def line():
+        if rng.random() < 0.1:
+            return ""
+        return "|".join(
+            " ".join(word() for _ in range(rng.randint(1, 2)))
+            for _ in range(rng.randint(1, 4))
+        )
+
+    def make(max_lines=12):
+        lines = [line() for _ in range(rng.randint(1, max_lines))]
+        return lines + [""] * (32 - len(lines))
+
+    return make
+
+
+@pytest.fixture
+def random_ucode(rng):
+    """Makes random UCode programs, as lines of text"""
+
+    def reg(is_dest):
+        bank = rng.choice("uoj" if is_dest else "ciauoj")
+        if bank == "c":
+            return "c" + str(rng.randint(0, 1))
+        return bank + str(rng.randint(1, 12 if bank == "i" else 6))
+
+    def make(max_lines=12):
+        lines = []
+        for _ in range(rng.randint(0, max_lines)):
+            op = rng.choice(list(GATE_ARGS))
+            args = [reg(False) for _ in range(GATE_ARGS[op])]
+            lines.append(" ".join([reg(True), "=", op] + args))
+        return lines
+
+    return make
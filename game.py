@@ -1,32 +1,112 @@
-import os
+import asyncio
+import signal
+import sys
+
 from blessed import Terminal
 
-from asm_editor import AsmEditor
 from puzzle_list import PuzzleList
+from screen import screen_of
 
 term = Terminal()
 esc_delay = 0.05
+screen = screen_of(term)
+# Shortest time between flushes to the terminal
+FRAME_TIME = 1 / 60
 
-print(term.home + term.clear)
-
-# editor = AsmEditor(term, esc_delay)
-editor = PuzzleList(term, esc_delay)
-editor.draw()
-while True:
-    while term.width < 125 or term.height < 42:
-        while term.width < 125:
-            print(term.home + term.clear)
-            print(
-                term.white_on_black("Please resize terminal to at least 125 columns.")
-            )
-            _ = term.inkey(timeout=0.1)  # Probably better way to do this?
-        while term.height < 42:
-            print(term.home + term.clear)
-            print(term.white_on_black("Please resize terminal to at least 42 lines."))
-            _ = term.inkey(timeout=0.1)  # Probably better way to do this?
-        editor.draw()
-    with term.cbreak(), term.hidden_cursor():
-        inp = term.inkey(esc_delay=esc_delay)
+
+def size_problem():
+    """What to ask of the player if the terminal is too small, or None"""
+    if term.width < 125:
+        return "Please resize terminal to at least 125 columns."
+    if term.height < 42:
+        return "Please resize terminal to at least 42 lines."
+    return None
+
+
+async def read_keys(keys):
+    """Put keypresses on the keys queue as they arrive on stdin"""
+    readable = asyncio.Event()
+    asyncio.get_running_loop().add_reader(sys.stdin, readable.set)
+    while True:
+        await readable.wait()
+        readable.clear()
+        # One read can hold several keys, which blessed keeps until asked
+        while True:
+            inp = term.inkey(timeout=0, esc_delay=esc_delay)
+            if not inp:
+                break
+            keys.put_nowait(inp)
+
+
+async def handle_keys(editor, keys, wake, dirty):
+    """Pass keys to the editor, until it says to quit"""
+    while True:
+        inp = await keys.get()
+        # Until the terminal is big enough, there's nothing to press
+        if size_problem() is not None:
+            continue
         if not editor.keypress(inp):
-            print(term.clear)
-            break
+            return
+        wake.set()
+        dirty.set()
+
+
+async def tick(editor, wake, dirty):
+    """Run the editor's frames, whenever it has any (see AsmEditor.tick)"""
+    while True:
+        delay = editor.tick()
+        if delay is None:
+            # Nothing's running until a key starts something
+            await wake.wait()
+            wake.clear()
+        else:
+            dirty.set()
+            await asyncio.sleep(delay)
+
+
+async def render(dirty):
+    """Flush the screen whenever something's drawn, at most once a frame"""
+    while True:
+        await dirty.wait()
+        dirty.clear()
+        message = size_problem()
+        if message is None:
+            screen.flush()
+        else:
+            print(term.home + term.clear + term.white_on_black(message))
+            # The message went straight to the terminal
+            screen.invalidate()
+        await asyncio.sleep(FRAME_TIME)
+
+
+async def main():
+    editor = PuzzleList(term, esc_delay)
+    editor.draw()
+
+    keys = asyncio.Queue()
+    wake = asyncio.Event()
+    dirty = asyncio.Event()
+    dirty.set()
+
+    def resized():
+        screen.invalidate()
+        dirty.set()
+
+    asyncio.get_running_loop().add_signal_handler(signal.SIGWINCH, resized)
+
+    tasks = [
+        asyncio.create_task(read_keys(keys)),
+        asyncio.create_task(tick(editor, wake, dirty)),
+        asyncio.create_task(render(dirty)),
+    ]
+    try:
+        await handle_keys(editor, keys, wake, dirty)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+if __name__ == "__main__":
+    with term.cbreak(), term.hidden_cursor():
+        asyncio.run(main())
+    print(term.clear)
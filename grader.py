@@ -0,0 +1,581 @@
+import argparse
+import concurrent.futures
+import os
+import sys
+import time
+
+from asm import Asm, CycleDetector, compile_program
+from ucode import UCode
+
+NUM_LINES = 32
+# How much the editors hold: columns of an Asm line, and lines and columns of
+# a UCode program
+CODE_WIDTH = 42
+UCODE_LINES = 32
+UCODE_WIDTH = 26
+# Steps between cycle checks, when running compiled. Any repeated state means
+# a loop, so checking less often only makes loops take longer to spot.
+CYCLE_CHECK_EVERY = 64
+
+
+class PuzzleRun:
+    """Runs a program against each test case of a puzzle in turn.
+
+    This is the same process as running it in the Asm editor, so passing here
+    means passing there, with the same step count.
+    """
+
+    def __init__(
+        self,
+        puzzle,
+        code_lines,
+        ucodes,
+        num_lines=NUM_LINES,
+        detect_cycles=None,
+        profile=False,
+        snapshot_every=None,
+        cust="table",
+    ):
+        self.puzzle = puzzle
+        self.code_lines = ["".join(line) for line in code_lines]
+        self.num_lines = num_lines
+
+        self.asm = Asm(Asm.parse(self.code_lines), ucodes, num_lines, cust)
+        self.asm.output_callback = lambda _, val: self._on_output(val)
+        if profile:
+            self.asm.enable_profiling()
+
+        self.total_steps = 0
+        self.test_case = 0
+        self.asm.load_stack(self.puzzle[2][self.test_case])
+        # Output of each test case so far, ending with the current one's
+        self.outputs = [[]]
+        self.output = self.outputs[0]
+        self.expected = self.puzzle[3][self.test_case]
+        self.passed = None
+
+        # The program ends once it runs past its last non-blank line
+        self.end = 0
+        for i, line in enumerate(self.code_lines[:num_lines]):
+            if line.strip() != "":
+                self.end = i + 1
+
+        # Set to (step, line) if the program gives a wrong output. Output is
+        # never taken back, so the run fails there and then.
+        self.wrong_output = None
+        self._wrong_line = None
+
+        # Set if detect_cycles ("exact" or "brent") finds the program looping
+        self.looped = False
+        self.detector = CycleDetector(detect_cycles) if detect_cycles else None
+
+        # With snapshot_every, snapshots[k] is the state after k * snapshot_every
+        # steps, for seek(). Output is only ever appended to, so its length is
+        # enough to restore it. With profile, the counts so far are kept too,
+        # so that steps run again aren't counted twice.
+        self.snapshot_every = snapshot_every
+        self.snapshots = []
+        if snapshot_every:
+            self._take_snapshot()
+
+    def _take_snapshot(self):
+        profile = self.asm.profile
+        self.snapshots.append(
+            (
+                self.test_case,
+                len(self.output),
+                self.asm.snapshot(),
+                None if profile is None else profile.snapshot(),
+            )
+        )
+
+    def step(self):
+        """Run one step. Returns False once the run has passed or failed."""
+        self.asm.step()
+        return self._after_step()
+
+    def _on_output(self, val):
+        # Only the new value needs checking, as everything before it matched
+        i = len(self.output)
+        if self._wrong_line is None and (
+            len(self.expected) <= i or self.expected[i] != val
+        ):
+            self._wrong_line = self.asm.pc
+        self.output.append(val)
+
+    def _output_matches(self):
+        return self._wrong_line is None and len(self.output) == len(self.expected)
+
+    def _output_done(self):
+        """Whether the current test case's output has passed or failed yet"""
+        return self._wrong_line is not None or len(self.output) == len(self.expected)
+
+    def _after_step(self):
+        # Check for success, even when the prog is not in the process of
+        # finishing, because that way the machine doesn't have to know when to
+        # stop.
+        success = self._output_matches()
+        if success:
+            if len(self.puzzle[3]) <= self.test_case + 1:
+                self.passed = True
+                return False
+            else:
+                # Reset and start again!
+                self.test_case += 1
+                self.asm.load_stack(self.puzzle[2][self.test_case])
+                self.asm.pc = 0
+                self.outputs.append([])
+                self.output = self.outputs[-1]
+                self.expected = self.puzzle[3][self.test_case]
+                # States from the last test case say nothing about this one
+                if self.detector is not None:
+                    self.detector = CycleDetector(self.detector.mode)
+
+        if self._wrong_line is not None:
+            self.wrong_output = (self.total_steps + 1, self._wrong_line)
+            self.passed = False
+            return False
+
+        if self.end <= self.asm.pc:
+            self.passed = False
+            return False
+
+        if self.detector is not None and self.detector.check(self.asm):
+            self.passed = False
+            self.looped = True
+            return False
+
+        self.total_steps += 1
+        if self.snapshot_every and self.total_steps == (
+            len(self.snapshots) * self.snapshot_every
+        ):
+            self._take_snapshot()
+        return True
+
+    def run(self, max_steps=None, timeout=None):
+        """Step until the run ends, or max_steps or timeout seconds run out.
+
+        Without exact cycle detection, snapshots or profiling, and with CUSTs
+        run from tables, the program runs as a single compiled function (see
+        compile_program), which only stops to check new output. Brent cycle
+        detection then checks the machine every CYCLE_CHECK_EVERY steps.
+        """
+        if timeout is not None:
+            deadline = time.monotonic() + timeout
+
+        if (
+            (self.detector is not None and self.detector.mode == "exact")
+            or self.snapshot_every
+            or self.asm.profile is not None
+            or self.asm.cust != "table"
+        ):
+            while self.step():
+                if max_steps is not None and max_steps <= self.total_steps:
+                    break
+                if timeout is not None and self.total_steps % 1024 == 0:
+                    if deadline <= time.monotonic():
+                        break
+            return
+
+        program = compile_program(self.asm.cmds)
+        while self.passed is None:
+            budget = float("inf")
+            if max_steps is not None:
+                budget = max(max_steps - self.total_steps, 1)
+            if timeout is not None:
+                budget = min(budget, 1024)
+            if self.detector is not None:
+                budget = min(budget, CYCLE_CHECK_EVERY)
+            if self._output_matches():
+                # Expecting no output, so the next step passes whatever it does
+                budget = 1
+
+            steps = program(self.asm, budget, self._output_done)
+            if steps == 0:
+                # Nothing but blank lines, so one step() ends the run
+                self.step()
+                break
+
+            # Every line but the last was an ordinary step, and the last gets
+            # the same checks as step() gives it
+            self.total_steps += steps - 1
+            if self.num_lines <= self.asm.pc:
+                self.asm.pc = 0
+            self._after_step()
+
+            if max_steps is not None and max_steps <= self.total_steps:
+                break
+            if timeout is not None and deadline <= time.monotonic():
+                break
+
+    def seek(self, step):
+        """Go back or forward to just after the given number of steps.
+
+        Needs snapshot_every: this restores the last snapshot at or before
+        step, and runs on from there. Returns False if the run ends first, like
+        step(). Going back starts cycle detection over.
+        """
+        step = max(step, 0)
+        if step < self.total_steps or self.passed is not None:
+            index = min(step // self.snapshot_every, len(self.snapshots) - 1)
+            del self.snapshots[index + 1 :]
+            self.test_case, num_outputs, asm_snapshot, profile = self.snapshots[index]
+            del self.outputs[self.test_case + 1 :]
+            self.output = self.outputs[self.test_case]
+            del self.output[num_outputs:]
+            self.expected = self.puzzle[3][self.test_case]
+            self.asm.restore(asm_snapshot)
+            if profile is not None:
+                self.asm.profile.restore(profile)
+
+            self.total_steps = index * self.snapshot_every
+            self.passed = None
+            self.looped = False
+            # Snapshots come before any wrong output
+            self.wrong_output = None
+            self._wrong_line = None
+            if self.detector is not None:
+                self.detector = CycleDetector(self.detector.mode)
+
+        while self.total_steps < step:
+            if not self.step():
+                return False
+        return True
+
+    def step_back(self):
+        """Undo the last step, including one that ended the run"""
+        if self.passed is None:
+            return self.seek(self.total_steps - 1)
+        return self.seek(self.total_steps)
+
+
+def find_puzzle(name):
+    """Look up a puzzle by its number (from 1) or its title"""
+    from puzzle_list import puzzles
+
+    if name.isdigit() and 1 <= int(name) <= len(puzzles):
+        return puzzles[int(name) - 1]
+    for puzzle in puzzles:
+        if puzzle[0].lower() == name.lower():
+            return puzzle
+    raise ValueError(f"No puzzle called {name!r}")
+
+
+def read_lines(path):
+    with open(path) as f:
+        return f.read().splitlines()
+
+
+def load_program(code_lines, ucode_lines):
+    """Check and parse a program given as lines of text.
+
+    code_lines is the Asm program, and ucode_lines a list of up to three UCode
+    programs for CUST1-3. Returns the code padded to NUM_LINES lines, and the
+    three UCodes. Raises ValueError if anything doesn't parse, or wouldn't fit
+    in the game's editors.
+    """
+    if NUM_LINES < len(code_lines):
+        raise ValueError(f"Programs can be at most {NUM_LINES} lines long")
+    code_lines = code_lines + [""] * (NUM_LINES - len(code_lines))
+    for i, line in enumerate(code_lines):
+        if CODE_WIDTH < len(line.rstrip()):
+            raise ValueError(f"Line {i} is over {CODE_WIDTH} characters long: {line!r}")
+    for i, cmd in enumerate(Asm.parse(code_lines)):
+        if cmd is None:
+            raise ValueError(f"Error on line {i}: {code_lines[i]!r}")
+
+    ucodes = []
+    for n in range(3):
+        lines = ucode_lines[n] if n < len(ucode_lines) else []
+        if UCODE_LINES < len(lines):
+            raise ValueError(f"CUST{n + 1} can be at most {UCODE_LINES} lines long")
+        for i, line in enumerate(lines):
+            if UCODE_WIDTH < len(line.rstrip()):
+                raise ValueError(
+                    f"CUST{n + 1} line {i + 1} is over {UCODE_WIDTH} characters "
+                    f"long: {line!r}"
+                )
+        insts = UCode.parse(lines)
+        for i, inst in enumerate(insts):
+            if inst is None:
+                raise ValueError(f"Error on CUST{n + 1} line {i + 1}: {lines[i]!r}")
+        ucodes.append(UCode(insts))
+
+    return code_lines, ucodes
+
+
+def grade(
+    puzzle,
+    code_lines,
+    ucode_lines,
+    max_steps=None,
+    timeout=None,
+    detect_cycles=None,
+    profile=False,
+    cust="table",
+):
+    """Run a program on every test case of a puzzle, without a UI.
+
+    Takes lines of text as for load_program. Returns the PuzzleRun, which has
+    passed set to True or False, or None if it ran out of steps or seconds.
+    With detect_cycles, a program caught looping fails with looped set. With
+    profile, run.asm.profile holds a Profile of the whole run. cust picks
+    how CUSTs run, as for Asm.
+    """
+    code_lines, ucodes = load_program(code_lines, ucode_lines)
+    run = PuzzleRun(
+        puzzle,
+        code_lines,
+        ucodes,
+        detect_cycles=detect_cycles,
+        profile=profile,
+        cust=cust,
+    )
+    run.run(max_steps, timeout)
+    return run
+
+
+def read_submission(path):
+    """Read a submission directory.
+
+    It holds the Asm program in program.asm, and optionally CUST1-3 in
+    cust1.ucode, cust2.ucode and cust3.ucode.
+    """
+    code_lines = read_lines(os.path.join(path, "program.asm"))
+    ucode_lines = []
+    for n in range(3):
+        ucode_path = os.path.join(path, f"cust{n + 1}.ucode")
+        ucode_lines.append(read_lines(ucode_path) if os.path.exists(ucode_path) else [])
+    return code_lines, ucode_lines
+
+
+def _grade_test_case(name, puzzle, test_case, program, options):
+    single = puzzle[:2] + [[puzzle[2][test_case]], [puzzle[3][test_case]]]
+    result = {"submission": name, "test_case": test_case, "error": None}
+    try:
+        run = grade(single, *program, **options)
+    except ValueError as e:
+        result.update(passed=False, steps=0, error=str(e))
+        return result
+
+    result.update(
+        passed=run.passed,
+        steps=run.total_steps,
+        output=run.output,
+        looped=run.looped,
+        wrong_output=run.wrong_output,
+    )
+    return result
+
+
+def grade_batch(
+    puzzle,
+    submissions,
+    max_steps=None,
+    timeout=None,
+    detect_cycles=None,
+    jobs=None,
+    cust="table",
+):
+    """Grade many submissions at once, one test case per process.
+
+    submissions maps names to (code_lines, ucode_lines) pairs. max_steps,
+    timeout, detect_cycles and cust are as for grade(), applied to each test
+    case on its own. Yields a result dict per test case as soon as it
+    finishes, in no particular order.
+    """
+    options = {
+        "max_steps": max_steps,
+        "timeout": timeout,
+        "detect_cycles": detect_cycles,
+        "cust": cust,
+    }
+    with concurrent.futures.ProcessPoolExecutor(jobs) as pool:
+        futures = [
+            pool.submit(_grade_test_case, name, puzzle, test_case, program, options)
+            for name, program in submissions.items()
+            for test_case in range(len(puzzle[2]))
+        ]
+        for future in concurrent.futures.as_completed(futures):
+            yield future.result()
+
+
+def total_steps(results):
+    """Steps for a whole run from per-test-case results, as grade() counts them.
+
+    The step that passes a test case counts, except on the last one.
+    """
+    return sum(result["steps"] for result in results) + len(results) - 1
+
+
+def _print_run(title, run):
+    if run.passed:
+        print(f"PASS {title}: {run.total_steps} steps")
+    elif run.passed is None:
+        print(f"FAIL {title}: no result after {run.total_steps} steps")
+    elif run.looped:
+        print(f"FAIL {title}: stuck in a loop after {run.total_steps} steps")
+    elif run.wrong_output is not None:
+        step, line = run.wrong_output
+        print(
+            f"FAIL {title}: test case {run.test_case + 1} gave output "
+            f"{run.output} at step {step} (line {line}), expecting "
+            f"{run.expected[: len(run.output)]}"
+        )
+    else:
+        print(
+            f"FAIL {title}: test case {run.test_case + 1} ended with output "
+            f"{run.output} after {run.total_steps} steps"
+        )
+
+
+def _print_profile(run):
+    profile = run.asm.profile
+    code_lines = run.code_lines
+    total_time = sum(profile.line_time)
+    print("line      hits    time")
+    for i, hits in enumerate(profile.line_hits):
+        if hits:
+            share = profile.line_time[i] / total_time if total_time else 0
+            print(f"{i:>4} {hits:>9} {share:>6.1%}  {code_lines[i]}")
+    for n in range(3):
+        if profile.cust_calls[n]:
+            print(
+                f"CUST{n + 1}: {profile.cust_calls[n]} calls, "
+                f"{profile.cust_time[n] * 1000:.1f} ms"
+            )
+            if run.asm.cust == "cached":
+                info = run.asm.ucodes[n].run_cached.cache_info()
+                print(f"  cache: {info.hits} hits, {info.misses} misses")
+    print(f"Other commands: {profile.plain_time * 1000:.1f} ms")
+
+
+def _main_batch(puzzle, paths, args):
+    submissions = {}
+    for path in paths:
+        try:
+            submissions[path] = read_submission(path)
+        except OSError as e:
+            print(f"ERROR {path}: {e}")
+
+    by_submission = {name: [] for name in submissions}
+    for result in grade_batch(
+        puzzle,
+        submissions,
+        args.max_steps,
+        args.timeout,
+        None if args.detect_cycles == "off" else args.detect_cycles,
+        args.jobs,
+        args.cust,
+    ):
+        by_submission[result["submission"]].append(result)
+        if result["error"] is not None:
+            status = "ERROR " + result["error"]
+        elif result["passed"]:
+            status = f"PASS {result['steps']} steps"
+        elif result["passed"] is None:
+            status = f"FAIL no result after {result['steps']} steps"
+        elif result["looped"]:
+            status = f"FAIL stuck in a loop after {result['steps']} steps"
+        elif result["wrong_output"] is not None:
+            step, line = result["wrong_output"]
+            status = f"FAIL gave output {result['output']} at step {step} (line {line})"
+        else:
+            status = f"FAIL ended with output {result['output']}"
+        print(f"  {result['submission']} test case {result['test_case'] + 1}: {status}")
+
+    all_passed = len(submissions) == len(paths)
+    for name, results in by_submission.items():
+        if all(result["passed"] for result in results):
+            print(f"PASS {name}: {total_steps(results)} steps")
+        else:
+            print(f"FAIL {name}")
+            all_passed = False
+    return 0 if all_passed else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Check solutions against every test case of a puzzle."
+    )
+    parser.add_argument("puzzle", help="puzzle number (1-9) or title")
+    parser.add_argument(
+        "paths",
+        nargs="+",
+        metavar="path",
+        help="Deep Assembly program file followed by Deeper Microcode files for "
+        "CUST1, CUST2, CUST3, or with --batch, submission directories",
+    )
+    parser.add_argument(
+        "--max-steps",
+        type=int,
+        default=100000,
+        help="give up after this many steps (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="grade directories holding program.asm and cust1-3.ucode in parallel",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        help="give up after this many seconds per test case",
+    )
+    parser.add_argument(
+        "--detect-cycles",
+        choices=["off", "exact", "brent"],
+        default="brent",
+        help="fail programs caught repeating a machine state (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="show how often each line and CUST ran, and where the time went",
+    )
+    parser.add_argument(
+        "--cust",
+        choices=["table", "cached", "run"],
+        default="table",
+        help="run CUSTs from a full table, a cache of results so far, or by "
+        "running the microcode every time (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=None, help="processes to use (default: all cores)"
+    )
+    args = parser.parse_args(argv)
+    if not args.batch and 4 < len(args.paths):
+        parser.error("at most three CUST files")
+
+    try:
+        puzzle = find_puzzle(args.puzzle)
+    except ValueError as e:
+        print("ERROR:", e)
+        return 2
+    if args.batch:
+        return _main_batch(puzzle, args.paths, args)
+
+    try:
+        run = grade(
+            puzzle,
+            read_lines(args.paths[0]),
+            [read_lines(path) for path in args.paths[1:]],
+            args.max_steps,
+            args.timeout,
+            None if args.detect_cycles == "off" else args.detect_cycles,
+            args.profile,
+            args.cust,
+        )
+    except (OSError, ValueError) as e:
+        print("ERROR:", e)
+        return 2
+
+    _print_run(puzzle[0], run)
+    if args.profile:
+        _print_profile(run)
+    return 0 if run.passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
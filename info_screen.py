@@ -1,6 +1,7 @@
 import textwrap
 
 from nano_editor import NanoEditor, outline_editor
+from screen import screen_of
 
 info_text = [
     """Thank you for purchasing DEEPER BROS. (R) DIGITAL COMPUTER v0.23!  
@@ -70,7 +71,7 @@ Using an incorrect number of arguments (e.g. "U1 = OR I1"), or incorrect spacing
     """EDITING AND RUNNING CODE
 The DEEPER BROS. (R) DIGITAL COMPUTER v0.23 comes with code editors and execution environments for both Deep Assembly and Deeper Microcode.
 
-In the Deep Assembly editor, you may edit the assembly code, and also launch Deeper Microcode sub-editors for the three custom commands.  Also, the stack and output are displayed for your convenience.  Any lines with errors in the Deep Assembly code are highlighted in red.  When there are no errors, you may run the program
+In the Deep Assembly editor, you may edit the assembly code, and also launch Deeper Microcode sub-editors for the three custom commands.  Also, the stack and output are displayed for your convenience.  Any lines with errors in the Deep Assembly code are highlighted in red.  When there are no errors, you may run the program.  Press H to show a heat column beside the line numbers, shaded by how many times each line ran.  While the program runs, SPACE pauses it, LEFT and RIGHT step backwards and forwards, and UP and DOWN jump 100 steps at a time.  Press S, before or during a run, to change the speed: 5 Hz, 10 or 100 steps at a time, or as fast as the CPU will go.
 
 Each Deep Assembly program has a goal, such as squaring numbers.  Input is given as the starting Stack.  Output is taken from the write-only Output list.  Each task comes with several test cases; after one passes successfully, the next begins automatically.  The program is considered successful if all test cases pass.
 
@@ -115,7 +116,7 @@ class InfoScreen:
         self.info_screen.contents = wrapped
 
     def draw(self):
-        print(self.term.clear)
+        screen_of(self.term).clear()
 
         self._fill_screen()
 
@@ -1,3 +1,6 @@
+from screen import screen_of
+
+
 def chars_to_bools(chars):
     # assert all([c == "0" or c == "1" for c in chars])
     return [c == "1" for c in chars] + [False] * (6 - len(chars))
@@ -10,21 +13,17 @@ def bools_to_chars(bools):
 def draw_outline(term, start_coords, end_coords, title=None, color=None):
     if color == None:
         color = term.green_on_black
-    print(
-        term.move_xy(start_coords[0], start_coords[1])
-        + color("┌" + "─" * (end_coords[0] - start_coords[0] - 1) + "┐")
-    )
+    screen = screen_of(term)
+    width = end_coords[0] - start_coords[0] - 1
+    screen.write(start_coords[0], start_coords[1], "┌" + "─" * width + "┐", color)
     for y in range(start_coords[1] + 1, end_coords[1]):
-        print(term.move_xy(start_coords[0], y) + color("│"))
-        print(term.move_xy(end_coords[0], y) + color("│"))
-    print(
-        term.move_xy(start_coords[0], end_coords[1])
-        + color("└" + "─" * (end_coords[0] - start_coords[0] - 1) + "┘")
-    )
+        screen.write(start_coords[0], y, "│", color)
+        screen.write(end_coords[0], y, "│", color)
+    screen.write(start_coords[0], end_coords[1], "└" + "─" * width + "┘", color)
 
     if title is not None:
-        assert len(title) <= end_coords[0] - start_coords[0] - 1
-        print(term.move_xy(start_coords[0] + 1, start_coords[1]) + color(title))
+        assert len(title) <= width
+        screen.write(start_coords[0] + 1, start_coords[1], title, color)
 
 
 def outline_editor(term, editor, title, color=None):
@@ -75,6 +74,7 @@ class NanoEditor:
         else:
             contents = self.contents
 
+        screen = screen_of(self.term)
         for y, line in enumerate(contents):
             line = "".join(line)
 
@@ -88,26 +88,16 @@ class NanoEditor:
                 self.term.black_on_green
             )
 
+            x = self.origin[0]
+            row = self.origin[1] + y
+            screen.write(x, row, line + " " * (self.size[0] - len(line)), line_color)
             if self.cursor[1] == y and self.is_focused:
                 assert self.cursor[0] <= len(line)
                 assert self.cursor[0] <= self.size[0] - 1
-                colored_line = line_color(line[: self.cursor[0]])
-                if len(line) == self.cursor[0]:  # cursor is hanging out after the line
-                    colored_line += cursor_color(" ")
-                    # One extra char for cursor
-                    colored_line += line_color(" " * (self.size[0] - len(line) - 1))
-                elif len(line) == self.cursor[0] + 1:  # cursor is on last char of line
-                    colored_line += cursor_color(line[self.cursor[0]])
-                    colored_line += line_color(" " * (self.size[0] - len(line)))
-                else:
-                    colored_line += cursor_color(line[self.cursor[0]])
-                    colored_line += line_color(line[self.cursor[0] + 1 :])
-                    colored_line += line_color(" " * (self.size[0] - len(line)))
-            else:
-                colored_line = line_color(line)
-                colored_line += line_color(" " * (self.size[0] - len(line)))
-
-            print(self.term.move_xy(self.origin[0], self.origin[1] + y) + colored_line)
+                # The cursor is a highlighted char, or space if it's hanging out
+                # after the line
+                char = line[self.cursor[0]] if self.cursor[0] < len(line) else " "
+                screen.write(x + self.cursor[0], row, char, cursor_color)
 
     def keypress(self, inp):
         if inp.code == self.term.KEY_LEFT:
@@ -1,6 +1,6 @@
 from info_screen import InfoScreen
 from nano_editor import NanoEditor, outline_editor
-from asm_editor import AsmEditor
+from screen import screen_of
 
 # A puzzle is a list of [title, description, inputs, outputs]
 puzzles = [
@@ -50,7 +50,7 @@ puzzles = [
         "SORT",
         "Given unique inputs less than 10, output\nthem sorted in increasing order.",
         [[3, 1, 4, 5, 9, 2, 6, 8, 7, 0], [1, 7, 9, 4, 3, 5, 6, 0]],
-        [[0, 1, 2, 3, 4, 5, 6, 7, 8, 9], [0, 1, 3, 4, 5, 7, 9]],
+        [[0, 1, 2, 3, 4, 5, 6, 7, 8, 9], [0, 1, 3, 4, 5, 6, 7, 9]],
     ],
     [
         "PRIME",
@@ -84,15 +84,14 @@ class PuzzleList:
             self.puzzle_buttons.append(editor)
 
         self.info_screen = InfoScreen(self.term)
-        self.asm_sub_editors = [
-            AsmEditor(self.term, esc_delay, puzzles[i]) for i in range(len(puzzles))
-        ]
+        # Each puzzle's editor is made when the puzzle is first opened
+        self.asm_sub_editors = [None] * len(puzzles)
 
         self.cursor = [0, 0]
         self.is_editing = False
 
     def draw(self):
-        print(self.term.clear)
+        screen_of(self.term).clear()
 
         is_highlighted = self.cursor[1] == 0
         outline_color = (
@@ -116,15 +115,30 @@ class PuzzleList:
             outline_editor(self.term, button, title, color=outline_color)
             button.draw()
 
+    def _asm_editor(self):
+        """The editor for the puzzle under the cursor, made if it's not yet"""
+        i = (self.cursor[1] * 3) + self.cursor[0] - 3
+        if self.asm_sub_editors[i] is None:
+            # Imported here, as it brings in the whole machine, which the
+            # first frame doesn't need
+            from asm_editor import AsmEditor
+
+            self.asm_sub_editors[i] = AsmEditor(self.term, self.esc_delay, puzzles[i])
+        return self.asm_sub_editors[i]
+
+    def tick(self):
+        """Run the open Asm editor's program, as AsmEditor.tick"""
+        if self.is_editing and self.cursor[1] != 0:
+            return self._asm_editor().tick()
+        return None
+
     def keypress(self, inp):
         do_draw = True
         if self.is_editing:
             if self.cursor[1] == 0:
                 self.is_editing = self.info_screen.keypress(inp)
             else:
-                self.is_editing = self.asm_sub_editors[
-                    (self.cursor[1] * 3) + self.cursor[0] - 3
-                ].keypress(inp)
+                self.is_editing = self._asm_editor().keypress(inp)
             do_draw = not self.is_editing
         else:
             if inp.code == self.term.KEY_ESCAPE:
@@ -135,9 +149,7 @@ class PuzzleList:
                     self.info_screen.draw()
                     do_draw = False
                 else:
-                    self.asm_sub_editors[
-                        (self.cursor[1] * 3) + self.cursor[0] - 3
-                    ].draw()
+                    self._asm_editor().draw()
                     do_draw = False
             elif inp.code == self.term.KEY_LEFT:
                 if 0 < self.cursor[0] and self.cursor[1] != 0:
@@ -0,0 +1,95 @@
+# What an untouched cell looks like: a space, with no color
+BLANK = (" ", "")
+
+
+class Screen:
+    """An in-memory copy of the terminal, that's drawn to instead of printing.
+
+    Drawing changes cells here and marks them as damaged. flush() then sends
+    just the damaged cells that differ from what's on the terminal, as one
+    write, so redrawing a whole frame costs little more than what changed.
+    """
+
+    def __init__(self, term):
+        self.term = term
+        # (x, y) -> (char, color sequence), for the frame being drawn and for
+        # what the terminal shows
+        self.cells = {}
+        self.shown = {}
+        self.damaged = set()
+        # Set when the terminal has been drawn on behind our back
+        self.is_stale = True
+
+    def clear(self):
+        """Blank the frame, as print(term.clear) used to"""
+        self.damaged.update(self.cells)
+        self.cells = {}
+
+    def write(self, x, y, text, color=None):
+        """Put text at (x, y), in color (a blessed formatting string)"""
+        sequence = "" if color is None else str(color)
+        for i, char in enumerate(text):
+            pos = (x + i, y)
+            cell = (char, sequence)
+            if self.cells.get(pos, BLANK) != cell:
+                self.cells[pos] = cell
+                self.damaged.add(pos)
+
+    def invalidate(self):
+        """Repaint everything on the next flush, e.g. after a print"""
+        self.is_stale = True
+
+    def flush(self):
+        out = []
+        if self.is_stale:
+            out.append(self.term.normal + self.term.home + self.term.clear)
+            self.shown = {}
+            self.damaged = set(self.cells)
+            self.is_stale = False
+
+        # Changed cells go out in reading order, so runs of them on a row need
+        # neither moves nor color changes in between
+        cursor = None
+        sequence = None
+        for pos in sorted(self.damaged, key=lambda pos: (pos[1], pos[0])):
+            cell = self.cells.get(pos, BLANK)
+            if self.shown.get(pos, BLANK) == cell:
+                continue
+            if cursor is not None and cursor[1] == pos[1] and pos[0] - cursor[0] <= 4:
+                # Writing a few unchanged cells again is shorter than a move
+                gap = [
+                    self.cells.get((x, pos[1]), BLANK) for x in range(cursor[0], pos[0])
+                ]
+                for char, gap_sequence in gap:
+                    if gap_sequence != sequence:
+                        out.append(self.term.normal + gap_sequence)
+                        sequence = gap_sequence
+                    out.append(char)
+            elif pos != cursor:
+                out.append(self.term.move_xy(*pos))
+            if cell[1] != sequence:
+                out.append(self.term.normal + cell[1])
+                sequence = cell[1]
+            out.append(cell[0])
+            cursor = (pos[0] + 1, pos[1])
+
+            if cell == BLANK:
+                del self.shown[pos]
+            else:
+                self.shown[pos] = cell
+        self.damaged.clear()
+
+        if out:
+            out.append(self.term.normal)
+            self.term.stream.write("".join(out))
+            self.term.stream.flush()
+
+
+_screens = {}
+
+
+def screen_of(term):
+    """The Screen for a terminal, shared by everything drawing on it"""
+    if term not in _screens:
+        _screens[term] = Screen(term)
+    return _screens[term]
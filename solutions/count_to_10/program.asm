@@ -0,0 +1,2 @@
+1|OUTPUT|PUSH
+POP 1|ADD|OUTPUT|PUSH|1|JMP
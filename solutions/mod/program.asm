@@ -0,0 +1,2 @@
+POP POP|CUST1 FIRST|SECOND PUSH|PUSH
+POP POP|SECOND|OUTPUT|0|JMP
@@ -0,0 +1 @@
+POP|CUST1|OUTPUT|0|JMP
@@ -0,0 +1,3 @@
+32|APPEND|0|PUSH
+POP POP|CUST1 SECOND|SECOND PUSH|APPEND
+POP|OUTPUT|PUSH|1|JMP
@@ -0,0 +1,3 @@
+0|PUSH
+POP POP|ADD CUST1|PUSH
+POP|OUTPUT|0|PUSH|1|JMP
@@ -0,0 +1,59 @@
+from collections import deque
+
+
+class StackOverflowError(Exception):
+    pass
+
+
+class Stack(deque):
+    """The Asm machine's stack, with the top at the end.
+
+    Pushing, popping, adding to the bottom and swapping are all O(1). With a
+    capacity, overflow decides what happens to a full stack: "discard" drops
+    an entry from the other end to make room, "ignore" drops the new value,
+    and "error" raises StackOverflowError.
+    """
+
+    def __init__(self, values=(), capacity=None, overflow="discard"):
+        assert overflow in ["discard", "ignore", "error"]
+        super().__init__(values, capacity if overflow == "discard" else None)
+        self.capacity = capacity
+        self.overflow = overflow
+
+        # Nothing to check, so skip the Python-level methods
+        if capacity is None or overflow == "discard":
+            self.push = self.append
+            self.append_bottom = self.appendleft
+
+    def _is_full(self):
+        if len(self) < self.capacity:
+            return False
+        if self.overflow == "error":
+            raise StackOverflowError(f"Stack is full ({self.capacity} entries)")
+        return True
+
+    def push(self, value):
+        if not self._is_full():
+            self.append(value)
+
+    def append_bottom(self, value):
+        if not self._is_full():
+            self.appendleft(value)
+
+    def swap(self):
+        """Swap the top two entries, as if the stack had 0s below the bottom"""
+        if 2 <= len(self):
+            self[-1], self[-2] = self[-2], self[-1]
+        elif len(self) == 1:
+            self.push(0)
+        else:
+            self.push(0)
+            self.push(0)
+
+    def snapshot(self):
+        """A copy of every entry, as a tuple, for restore()"""
+        return tuple(self)
+
+    def restore(self, snapshot):
+        self.clear()
+        self.extend(snapshot)
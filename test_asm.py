@@ -0,0 +1,48 @@
+from asm import Asm, compile_program
+from ucode import UCode
+
+
+def make_asm(lines, ucodes, stack):
+    asm = Asm(Asm.parse(lines), ucodes, 32)
+    asm.outputs = []
+    asm.output_callback = lambda asm, val: asm.outputs.append(val)
+    asm.load_stack(stack)
+    return asm
+
+
+def view(asm):
+    # compile_program leaves pc past the end where step() goes back to 0
+    return asm.pc if asm.pc < 32 else 0, list(asm.stack), asm.outputs
+
+
+def test_compile_program_matches_step(rng, random_asm, random_ucode):
+    checked = 0
+    while checked < 100:
+        lines = random_asm()
+        cmds = Asm.parse(lines)
+        if None in cmds:
+            continue
+        checked += 1
+
+        ucodes = [UCode(UCode.parse(random_ucode())) for _ in range(3)]
+        stack = [rng.randrange(64) for _ in range(rng.randint(0, 8))]
+        budget = rng.randint(1, 100)
+        stop_after = rng.randint(1, 5)
+
+        compiled = make_asm(lines, ucodes, stack)
+        program = compile_program(cmds)
+        steps = program(compiled, budget, lambda: stop_after <= len(compiled.outputs))
+
+        stepped = make_asm(lines, ucodes, stack)
+        stepped_steps = 0
+        while stepped_steps < budget and stepped.pc < program.end:
+            stepped_steps += 1
+            num_outputs = len(stepped.outputs)
+            if not stepped.step():
+                break
+            # A line that outputs is followed by a check of stop()
+            outputs = len(stepped.outputs)
+            if num_outputs < outputs and stop_after <= outputs:
+                break
+
+        assert (steps, view(compiled)) == (stepped_steps, view(stepped)), lines
@@ -0,0 +1,94 @@
+import random
+
+import pytest
+
+from bench import solution_dir
+from grader import PuzzleRun, find_puzzle, load_program, read_submission
+
+
+def view(run):
+    outputs = [list(output) for output in run.outputs]
+    return run.total_steps, run.test_case, outputs, run.asm.snapshot(), run.passed
+
+
+@pytest.mark.parametrize("name", ["count to 10", "sum", "mod", "sort", "wrong"])
+@pytest.mark.parametrize("snapshot_every", [1, 3, 7, 64])
+def test_seek_matches_running_forward(name, snapshot_every):
+    if name == "wrong":
+        # Counts 1, 2, 4, ..., so fails on its third output
+        puzzle = find_puzzle("count to 10")
+        code_lines, ucodes = load_program(
+            ["1|OUTPUT|PUSH", "POP 1|ADD|OUTPUT|PUSH|POP 1|ADD|PUSH|1|JMP"], []
+        )
+    else:
+        puzzle = find_puzzle(name)
+        code_lines, ucodes = load_program(*read_submission(solution_dir(puzzle)))
+
+    forward = PuzzleRun(puzzle, code_lines, ucodes)
+    views = [view(forward)]
+    while forward.step() and forward.total_steps < 300:
+        views.append(view(forward))
+    end = view(forward)
+
+    run = PuzzleRun(puzzle, code_lines, ucodes, snapshot_every=snapshot_every)
+    rng = random.Random(snapshot_every)
+    for _ in range(200):
+        if rng.random() < 0.8:
+            run.seek(rng.randrange(len(views) + 3))
+        else:
+            run.step_back()
+        if run.passed is None:
+            assert view(run) == views[run.total_steps]
+        else:
+            assert view(run) == end
+
+
+@pytest.mark.parametrize("mode", ["exact", "brent"])
+@pytest.mark.parametrize("snapshot_every", [None, 4])
+def test_same_start_in_next_test_case_is_not_a_loop(mode, snapshot_every):
+    # The last two test cases start in the same state, and both pass at once
+    puzzle = ["SAME", "", [[], [3], [3]], [[], [], []]]
+    code_lines, ucodes = load_program(["1|POP"], [])
+    run = PuzzleRun(
+        puzzle,
+        code_lines,
+        ucodes,
+        detect_cycles=mode,
+        snapshot_every=snapshot_every,
+    )
+    run.run(1000)
+    assert run.passed and not run.looped
+    assert run.total_steps == 2
+
+
+@pytest.mark.parametrize("period", [3, 5, 7])
+@pytest.mark.parametrize(
+    "options",
+    [
+        {"detect_cycles": "exact"},
+        {"detect_cycles": "brent", "snapshot_every": 4},
+        # Compiled, checking every CYCLE_CHECK_EVERY steps
+        {"detect_cycles": "brent"},
+    ],
+)
+def test_loop_with_odd_period_is_caught(period, options):
+    # Never outputs, and comes back to the same state every period steps
+    lines = ["1|POP"] * (period - 1) + ["0|JMP"]
+    code_lines, ucodes = load_program(lines, [])
+    run = PuzzleRun(find_puzzle("count to 10"), code_lines, ucodes, **options)
+    run.run(100000)
+    assert run.passed is False and run.looped
+    assert run.total_steps < 1000
+
+
+def test_seek_keeps_profile_counts():
+    puzzle = find_puzzle("sort")
+    code_lines, ucodes = load_program(*read_submission(solution_dir(puzzle)))
+    forward = PuzzleRun(puzzle, code_lines, ucodes, profile=True)
+    forward.run(150)
+
+    run = PuzzleRun(puzzle, code_lines, ucodes, profile=True, snapshot_every=16)
+    for step in [100, 40, 150, 3, 149, 150]:
+        run.seek(step)
+    for name in ["line_hits", "cust_calls"]:
+        assert getattr(run.asm.profile, name) == getattr(forward.asm.profile, name)
@@ -0,0 +1,90 @@
+import pytest
+
+from stack import Stack, StackOverflowError
+
+
+def test_swap_pads_with_zeros():
+    stack = Stack()
+    stack.swap()
+    assert list(stack) == [0, 0]
+
+    stack = Stack([5])
+    stack.swap()
+    assert list(stack) == [5, 0]
+
+    stack = Stack([1, 2, 3])
+    stack.swap()
+    assert list(stack) == [1, 3, 2]
+
+
+def test_append_bottom():
+    stack = Stack()
+    stack.append_bottom(4)
+    assert list(stack) == [4]
+
+    stack = Stack([1, 2])
+    stack.append_bottom(3)
+    assert list(stack) == [3, 1, 2]
+    assert stack.pop() == 2
+
+
+def test_unlimited_never_overflows():
+    stack = Stack()
+    for i in range(1000):
+        stack.push(i % 64)
+        stack.append_bottom(i % 64)
+    assert len(stack) == 2000
+
+
+def test_discard_drops_from_the_other_end():
+    stack = Stack([1, 2, 3], capacity=3, overflow="discard")
+    stack.push(4)
+    assert list(stack) == [2, 3, 4]
+    stack.append_bottom(5)
+    assert list(stack) == [5, 2, 3]
+
+
+def test_ignore_drops_the_new_value():
+    stack = Stack([1, 2, 3], capacity=3, overflow="ignore")
+    stack.push(4)
+    stack.append_bottom(5)
+    assert list(stack) == [1, 2, 3]
+
+
+def test_error_raises_when_full():
+    stack = Stack([1, 2, 3], capacity=3, overflow="error")
+    with pytest.raises(StackOverflowError):
+        stack.push(4)
+    with pytest.raises(StackOverflowError):
+        stack.append_bottom(5)
+    assert list(stack) == [1, 2, 3]
+
+    # Room for one more
+    stack.pop()
+    stack.push(4)
+    assert list(stack) == [1, 2, 4]
+
+
+@pytest.mark.parametrize("overflow", ["discard", "ignore", "error"])
+def test_swap_at_capacity(overflow):
+    full = Stack([1, 2], capacity=2, overflow=overflow)
+    full.swap()
+    assert list(full) == [2, 1]
+
+    # Swapping a short stack pushes 0s, which may not fit
+    short = Stack([7], capacity=1, overflow=overflow)
+    if overflow == "error":
+        with pytest.raises(StackOverflowError):
+            short.swap()
+    else:
+        short.swap()
+        assert list(short) == {"discard": [0], "ignore": [7]}[overflow]
+
+
+def test_snapshot_and_restore():
+    stack = Stack([1, 2, 3])
+    snapshot = stack.snapshot()
+    stack.pop()
+    stack.append_bottom(9)
+    stack.restore(snapshot)
+    assert list(stack) == [1, 2, 3]
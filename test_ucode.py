@@ -14,4 +14,4 @@ input2 = input1.copy()  # laaazy
 addr = input1.copy()  # lol
 
 ucode = UCode(insts)
-print(ucode.run(input1, input2, addr))
+print(ucode.run_bits(input1, input2, addr))
@@ -0,0 +1,81 @@
+import gc
+import weakref
+
+from uint import from_bits, to_bits
+from ucode import UCode
+
+
+def interpret(insts, pipe1, pipe2, addr):
+    """What the original interpreter gives on a fresh UCode, as ints"""
+    ucode = UCode(insts)
+    ucode.input_regs = to_bits(pipe1, 6) + to_bits(pipe2, 6)
+    ucode.addr_regs = to_bits(addr, 6)
+    ucode.jump_regs = to_bits((addr + 1) % 64, 6)
+    for inst in insts:
+        ucode.run_single_instruction(inst)
+    return tuple(
+        from_bits(regs)
+        for regs in [ucode.user_regs, ucode.output_regs, ucode.jump_regs]
+    )
+
+
+def random_inputs(rng, count):
+    return [tuple(rng.randrange(64) for _ in range(3)) for _ in range(count)]
+
+
+def test_run_matches_interpreter(rng, random_ucode):
+    for _ in range(50):
+        insts = UCode.parse(random_ucode())
+        ucode = UCode(insts)
+        for pipe1, pipe2, addr in random_inputs(rng, 50):
+            assert ucode.run(pipe1, pipe2, addr) == interpret(insts, pipe1, pipe2, addr)
+
+
+def test_tables_match_run(rng, random_ucode):
+    for _ in range(30):
+        ucode = UCode(UCode.parse(random_ucode()))
+        for pipe1, pipe2, addr in random_inputs(rng, 50):
+            _, output, jump = ucode.run(pipe1, pipe2, addr)
+            key = (pipe1 << 12) | (pipe2 << 6) | addr
+            assert ucode.table[key] == output | (jump << 8)
+            assert ucode.run_cached(key) == (output, jump)
+
+            # lookup and address_table give None for a jump that's always A + 1
+            if ucode.jump_is_default:
+                assert jump == (addr + 1) % 64
+                jump = None
+            assert ucode.lookup(pipe1, pipe2, addr) == (output, jump)
+            assert ucode.address_table(addr)[(pipe1 << 6) | pipe2] == (output, jump)
+
+
+def test_optimize_keeps_results(random_ucode):
+    for _ in range(100):
+        insts = UCode.parse(random_ucode(25))
+        original = UCode(insts)
+
+        optimized, before, after = UCode.optimize(insts)
+        assert after <= before
+        assert UCode(optimized).equivalent(original)
+
+        # keep_user also keeps the user registers intact
+        optimized, _, _ = UCode.optimize(insts, keep_user=True)
+        assert UCode(optimized).run_sliced() == original.run_sliced()
+
+
+def test_equivalent_spots_differences():
+    buf = UCode(UCode.parse(["o1 = buf i1"]))
+    assert buf.equivalent(UCode(UCode.parse(["o1 = and i1 c1"])))
+    assert not buf.equivalent(UCode(UCode.parse(["o1 = buf i2"])))
+    assert not buf.equivalent(UCode(UCode.parse(["o1 = buf i1", "j1 = buf c0"])))
+
+
+def test_dropped_ucode_is_freed_at_once():
+    ucode = UCode(UCode.parse(["o1 = buf i1"]))
+    ucode.run_cached(5)
+    ref = weakref.ref(ucode)
+    gc.disable()
+    try:
+        del ucode
+        assert ref() is None
+    finally:
+        gc.enable()
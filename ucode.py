@@ -1,4 +1,9 @@
-from uint import UintN
+import functools
+import itertools
+import sys
+from array import array
+
+from uint import from_bits, to_bits
 
 ucode_ref_sheet = """Commands:
 BUF  (1 arg): Return arg unmodified
@@ -21,6 +26,168 @@ Remember, invalid spacing and using the
 wrong number of args are both errors.
 """
 
+# Gate expressions over either single bools or bit-sliced ints, where `ones`
+# is the all-true value (True, or a mask with every slice bit set)
+gate_exprs = {
+    "buf": "{0}",
+    "not": "{0}",  # Matches run_single_instruction
+    "and": "{0} & {1}",
+    "or": "{0} | {1}",
+    "nand": "ones ^ ({0} & {1})",
+    "nor": "ones ^ ({0} | {1})",
+    "xor": "{0} ^ {1}",
+    "xnor": "ones ^ {0} ^ {1}",
+    "if": "({0} & {1}) | ((ones ^ {0}) & {2})",
+}
+
+
+def _reg_names(bank, count):
+    return ", ".join(bank + str(k + 1) for k in range(count))
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_insts(insts):
+    """Turn instructions into one straight-line function over local variables.
+
+    The function takes the input, address and initial jump registers as lists
+    plus `ones`, and returns the user, output and jump registers as lists.
+    """
+    body = [
+        "def ucode_fn(inputs, addrs, jumps, ones):",
+        "    " + _reg_names("i", 12) + " = inputs",
+        "    " + _reg_names("a", 6) + " = addrs",
+        "    " + _reg_names("j", 6) + " = jumps",
+        "    c0 = ones ^ ones",
+        "    c1 = ones",
+        "    " + _reg_names("u", 6) + " = [c0] * 6",
+        "    " + _reg_names("o", 6) + " = [c0] * 6",
+    ]
+    for inst in insts:
+        body.append("    " + inst[0] + " = " + gate_exprs[inst[1]].format(*inst[2:]))
+    body.append(
+        "    return " + ", ".join("[" + _reg_names(bank, 6) + "]" for bank in "uoj")
+    )
+
+    namespace = {}
+    exec(compile("\n".join(body), "<ucode>", "exec"), namespace)
+    return namespace["ucode_fn"]
+
+
+def _pack_bits(names):
+    return " | ".join(f"({name} << {5 - k})" for k, name in enumerate(names))
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_packed(insts):
+    """Turn instructions into a function over 6-bit ints, for one input.
+
+    The function takes pipe1, pipe2 and addr, and returns the user, output
+    and jump registers, each packed into an int with register 1 as the MSB.
+    Only the bits the instructions read are unpacked.
+    """
+    read = {arg for inst in insts for arg in inst[2:]}
+    written = {inst[0] for inst in insts}
+    body = ["def ucode_fn(pipe1, pipe2, addr):", "    ones = 1"]
+    for bank, field, first in [("i", "pipe1", 1), ("i", "pipe2", 7), ("a", "addr", 1)]:
+        for k in range(6):
+            name = bank + str(first + k)
+            if name in read:
+                body.append(f"    {name} = {field} >> {5 - k} & 1")
+
+    # By default, continue to next line
+    body.append("    jump = (addr + 1) & 63")
+    jumps = any(name[0] == "j" for name in written)
+    for k in range(6):
+        if jumps or f"j{k + 1}" in read:
+            body.append(f"    j{k + 1} = jump >> {5 - k} & 1")
+    for name in sorted(read | written):
+        if name[0] in "uo" or name == "c0":
+            body.append(f"    {name} = 0")
+        elif name == "c1":
+            body.append("    c1 = 1")
+
+    for inst in insts:
+        body.append("    " + inst[0] + " = " + gate_exprs[inst[1]].format(*inst[2:]))
+
+    results = []
+    for bank in "uoj":
+        names = [bank + str(k + 1) for k in range(6)]
+        if not any(name in written for name in names):
+            results.append("jump" if bank == "j" else "0")
+            continue
+        # Jump bits left alone keep their default
+        kept = [name if name in written or bank == "j" else "0" for name in names]
+        results.append(_pack_bits(kept))
+    body.append("    return " + ", ".join(results))
+
+    namespace = {}
+    exec(compile("\n".join(body), "<ucode packed>", "exec"), namespace)
+    return namespace["ucode_fn"]
+
+
+def _make_run_cached(packed_fn):
+    """A cache of packed_fn's output and jump, for UCode.run_cached.
+
+    It only holds on to packed_fn, not the UCode, so that dropping the UCode
+    frees it and its cache straight away, without waiting for the garbage
+    collector.
+    """
+
+    @functools.lru_cache(maxsize=4096)
+    def run_cached(key):
+        _, output, jump = packed_fn(key >> 12, key >> 6 & 63, key & 63)
+        return output, jump
+
+    return run_cached
+
+
+# Names of the CUST command arguments, and the input bits that hold them
+input_fields = {
+    "pipe1": ["i" + str(k + 1) for k in range(6)],
+    "pipe2": ["i" + str(k + 7) for k in range(6)],
+    "addr": ["a" + str(k + 1) for k in range(6)],
+}
+_field_shifts = {"pipe1": 12, "pipe2": 6, "addr": 0}
+
+
+# Every (input1, input2, addr) combination, indexed as in UCode.table
+NUM_INPUTS = 2**18
+ALL_ONES = (1 << NUM_INPUTS) - 1
+
+
+def _make_input_slices():
+    # Bit p of every index, as one int with bit `index` set if it's set there.
+    # Listed MSB first, so I1-I12 then A1-A6.
+    slices = []
+    for p in range(18):
+        half = 1 << p
+        block = ((1 << half) - 1) << half
+        slices.append(block * (ALL_ONES // ((1 << (2 * half)) - 1)))
+    return slices[::-1]
+
+
+_input_slices = None
+
+
+def input_slices():
+    global _input_slices
+    if _input_slices is None:
+        _input_slices = _make_input_slices()
+    return _input_slices
+
+
+_bit_chars = bytes.maketrans(b"01", b"\x00\x01")
+
+
+def _pack_slices(slices):
+    """Turn up to 8 slices (MSB first) into one byte per index"""
+    packed = 0
+    for slice_ in slices:
+        digits = format(slice_, f"0{NUM_INPUTS}b")[::-1].encode()
+        bits = int.from_bytes(digits.translate(_bit_chars), "little")
+        packed = (packed << 1) | bits
+    return packed.to_bytes(NUM_INPUTS, "little")
+
 
 class UCode:
     @classmethod
@@ -30,78 +197,210 @@ class UCode:
             if type(line) is list:
                 line = "".join(line)
 
-            line = line.rstrip()
+            insts.append(cls.parse_line(line.rstrip()))
 
-            # Blank line -> blank instruction
-            if line == "":
-                insts.append([])
-                continue
+        return insts
 
-            words = line.lower().split(" ")
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def parse_line(line):
+        """Parse one stripped line, caching the result.
 
-            # Prelim len check, rm equal sign
-            if len(words) < 4 or words[1] != "=":
-                insts.append(None)
-                continue
-            del words[1]
-
-            # Check number of arguments
-            num_args = {
-                "buf": 1,
-                "not": 1,
-                "and": 2,
-                "or": 2,
-                "nand": 2,
-                "nor": 2,
-                "xor": 2,
-                "xnor": 2,
-                "if": 3,
-            }
-            if len(words) != num_args.get(words[1], -999) + 2:
-                insts.append(None)
-                continue
+        Callers share the returned lists and mustn't modify them.
+        """
+        # Blank line -> blank instruction
+        if line == "":
+            return []
+
+        words = line.lower().split(" ")
 
-            # Check reg names
-            ok = True
-            for i, name in enumerate([words[0]] + words[2:]):
-                if len(name) < 2 or 3 < len(name) or not name[1:].isdigit():
-                    ok = False
-                    break
-
-                # Can't write to input regs
-                if i == 0 and name[0] in ["c", "i", "a"]:
-                    ok = False
-                    break
-
-                # Check index numbers
-                if name[0] in ["c"]:
-                    if int(name[1:]) not in [0, 1]:
-                        ok = False
-                        break
-                elif name[0] in ["u", "o", "a", "j"]:
-                    if int(name[1:]) < 1 or 6 < int(name[1:]):
-                        ok = False
-                        break
-                elif name[0] in ["i"]:
-                    if int(name[1:]) < 1 or 12 < int(name[1:]):
-                        ok = False
-                        break
-                else:
-                    ok = False
-                    break
-            if ok:
-                insts.append(words)
+        # Prelim len check, rm equal sign
+        if len(words) < 4 or words[1] != "=":
+            return None
+        del words[1]
+
+        # Check number of arguments
+        num_args = {
+            "buf": 1,
+            "not": 1,
+            "and": 2,
+            "or": 2,
+            "nand": 2,
+            "nor": 2,
+            "xor": 2,
+            "xnor": 2,
+            "if": 3,
+        }
+        if len(words) != num_args.get(words[1], -999) + 2:
+            return None
+
+        # Check reg names
+        for i, name in enumerate([words[0]] + words[2:]):
+            if len(name) < 2 or 3 < len(name) or not name[1:].isdigit():
+                return None
+
+            # Can't write to input regs
+            if i == 0 and name[0] in ["c", "i", "a"]:
+                return None
+
+            # Check index numbers
+            if name[0] in ["c"]:
+                if int(name[1:]) not in [0, 1]:
+                    return None
+            elif name[0] in ["u", "o", "a", "j"]:
+                if int(name[1:]) < 1 or 6 < int(name[1:]):
+                    return None
+            elif name[0] in ["i"]:
+                if int(name[1:]) < 1 or 12 < int(name[1:]):
+                    return None
             else:
-                insts.append(None)
+                return None
+
+        return words
+
+    @classmethod
+    def optimize(cls, insts, keep_user=False):
+        """Simplify parsed instructions without changing their results.
+
+        Folds constants, propagates copies made by BUF, and drops gates whose
+        results are never read. Only the output and jump registers are kept
+        intact unless keep_user is set. Returns the new instructions and the
+        gate counts before and after.
+        """
+        # Spell register names one way, e.g. "u01" -> "u1"
+        insts = [
+            [
+                name[0] + str(int(name[1:])) if i != 1 else name
+                for i, name in enumerate(inst)
+            ]
+            for inst in insts
+            if inst
+        ]
+        before = len(insts)
+
+        outputs = ["o" + str(k + 1) for k in range(6)]
+        outputs += ["j" + str(k + 1) for k in range(6)]
+        if keep_user:
+            outputs += ["u" + str(k + 1) for k in range(6)]
+
+        while True:
+            num_insts = len(insts)
+            insts = cls._dead_gates(cls._fold(insts), outputs)
+            if len(insts) == num_insts:
+                break
+
+        return insts, before, len(insts)
+
+    @classmethod
+    def _fold(cls, insts):
+        # What each register is currently known to hold a copy of. U and O
+        # start out as 0.
+        copies = {bank + str(k + 1): "c0" for bank in "uo" for k in range(6)}
+
+        folded = []
+        for dest, op, *args in insts:
+            args = [copies.get(arg, arg) for arg in args]
+            op, args = cls._simplify(op, args)
+
+            # Already holds this value
+            if op == "buf" and args[0] == copies.get(dest, dest):
                 continue
 
-        return insts
+            for name, source in list(copies.items()):
+                if source == dest:
+                    del copies[name]
+            copies.pop(dest, None)
+            if op == "buf":
+                copies[dest] = args[0]
+
+            folded.append([dest, op] + args)
+
+        return folded
+
+    @staticmethod
+    def _simplify(op, args):
+        consts = {"c0": False, "c1": True}
+        if all(arg in consts for arg in args):
+            expr = gate_exprs[op].format(*[str(consts[arg]) for arg in args])
+            return "buf", ["c1" if eval(expr, {"ones": True}) else "c0"]
+
+        if op in ["buf", "not"]:
+            return "buf", args
+        a, b = args[0], args[1]
+        if op == "and":
+            if "c0" in args:
+                return "buf", ["c0"]
+            if a == b or b == "c1":
+                return "buf", [a]
+            if a == "c1":
+                return "buf", [b]
+        elif op == "or":
+            if "c1" in args:
+                return "buf", ["c1"]
+            if a == b or b == "c0":
+                return "buf", [a]
+            if a == "c0":
+                return "buf", [b]
+        elif op == "nand":
+            if "c0" in args:
+                return "buf", ["c1"]
+        elif op == "nor":
+            if "c1" in args:
+                return "buf", ["c0"]
+        elif op == "xor":
+            if a == b:
+                return "buf", ["c0"]
+            if b == "c0":
+                return "buf", [a]
+            if a == "c0":
+                return "buf", [b]
+        elif op == "xnor":
+            if a == b:
+                return "buf", ["c1"]
+            if b == "c1":
+                return "buf", [a]
+            if a == "c1":
+                return "buf", [b]
+        elif op == "if":
+            if a == "c1" or b == args[2]:
+                return "buf", [b]
+            if a == "c0":
+                return "buf", [args[2]]
+        return op, args
+
+    @staticmethod
+    def _dead_gates(insts, outputs):
+        live = set(outputs)
+        kept = []
+        for inst in reversed(insts):
+            if inst[0] in live:
+                live.discard(inst[0])
+                live.update(inst[2:])
+                kept.append(inst)
+        kept.reverse()
+        return kept
 
     def __init__(self, insts):
         self.insts = insts
         self.user_regs = [False] * 6
         self.output_regs = [False] * 6
         self.jump_regs = [False] * 6
+        self._table = None
+        self._sliced = None
+        self._lookup = None
+        self._address_tables = {}
+
+        # Compiled once, and shared between UCodes with the same program
+        optimized, before, after = UCode.optimize(insts, keep_user=True)
+        self.gate_counts = before, after
+        optimized = tuple(tuple(inst) for inst in optimized)
+        self.fn = _compile_insts(optimized)
+        self.packed_fn = _compile_packed(optimized)
+
+        # Results for inputs seen so far, keyed on (pipe1 << 12) | (pipe2 << 6)
+        # | addr. Each UCode has its own, so editing the program (which makes
+        # a new UCode) starts it over. run_cached.cache_info() has the stats.
+        self.run_cached = _make_run_cached(self.packed_fn)
 
     def get_reg(self, name):
         bank = name[0]
@@ -158,15 +457,170 @@ class UCode:
             }[inst[1]],
         )
 
-    def run(self, input1, input2, addr):
+    def run(self, pipe1, pipe2, addr):
+        """Run on 6-bit ints, returning the user, output and jump registers.
+
+        Each register is an int, with register 1 as the MSB.
+        """
+        return self.packed_fn(pipe1, pipe2, addr)
+
+    def run_bits(self, input1, input2, addr):
+        """run() for lists of 6 bools, MSB first, as the UCode editor uses"""
         assert len(input1) == 6 and len(input2) == 6
         self.input_regs = input1 + input2
         self.addr_regs = addr.copy()
 
+        user, output, jump = self.run(
+            from_bits(input1), from_bits(input2), from_bits(addr)
+        )
+        self.user_regs = to_bits(user, 6)
+        self.output_regs = to_bits(output, 6)
+        self.jump_regs = to_bits(jump, 6)
+        return self.user_regs, self.output_regs, self.jump_regs
+
+    def run_sliced(self):
+        """Run on every input at once.
+
+        Each register bit is a NUM_INPUTS-bit int whose bit `index` is the
+        value for the input at that index in UCode.table. Returns user,
+        output and jump registers as lists of these.
+        """
+        if self._sliced is not None:
+            return self._sliced
+
+        self._sliced = tuple(self.fn(*self._sliced_args()))
+        return self._sliced
+
+    def _sliced_args(self):
+        slices = input_slices()
+        addrs = slices[12:]
+
         # By default, continue to next line
-        self.jump_regs = (UintN.from_bits(addr.copy()) + UintN(1, 6)).bits()
+        jumps = [None] * 6
+        carry = ALL_ONES
+        for k in range(5, -1, -1):
+            jumps[k] = addrs[k] ^ carry
+            carry &= addrs[k]
 
-        for inst in self.insts:
-            self.run_single_instruction(inst)
+        return slices[:12], addrs, jumps, ALL_ONES
 
-        return self.user_regs, self.output_regs, self.jump_regs
+    def equivalent(self, other):
+        """True if both programs give the same output and jump for all inputs"""
+        return self.run_sliced()[1:] == other.run_sliced()[1:]
+
+    @property
+    def table(self):
+        """Lookup table of every possible result, built on first use.
+
+        Indexed by (input1 << 12) | (input2 << 6) | addr, each entry holds
+        output | (jump << 8).
+        """
+        if self._table is None:
+            self._table = self.tabulate()
+        return self._table
+
+    def tabulate(self):
+        # Only output and jump end up in the table, so user regs can go too
+        optimized, _, _ = UCode.optimize(self.insts)
+        fn = _compile_insts(tuple(tuple(inst) for inst in optimized))
+        _, output, jump = fn(*self._sliced_args())
+        entries = bytearray(2 * NUM_INPUTS)
+        entries[0::2] = _pack_slices(output)
+        entries[1::2] = _pack_slices(jump)
+
+        table = array("H")
+        table.frombytes(entries)
+        if sys.byteorder == "big":
+            table.byteswap()
+        return table
+
+    def dependencies(self):
+        """Which inputs each output and jump bit actually depends on.
+
+        Returns a dict from "o1"-"o6" and "j1"-"j6" to sets of input names
+        ("i1"-"i12", "a1"-"a6"). This is exact rather than a guess from the
+        gates used: an input counts only if flipping it changes the bit for
+        some input.
+        """
+        _, output, jump = self.run_sliced()
+        slices = input_slices()
+        names = input_fields["pipe1"] + input_fields["pipe2"] + input_fields["addr"]
+
+        deps = {}
+        for bank, regs in [("o", output), ("j", jump)]:
+            for k, reg in enumerate(regs):
+                deps[bank + str(k + 1)] = {
+                    name
+                    for p, (name, mask) in enumerate(zip(names, slices))
+                    if (reg & mask) >> (1 << (17 - p)) != reg & (ALL_ONES ^ mask)
+                }
+        return deps
+
+    @property
+    def jump_is_default(self):
+        """True if J always ends up as A + 1, i.e. the program never jumps"""
+        return self.run_sliced()[2] == self._sliced_args()[2]
+
+    def used_fields(self):
+        """The CUST arguments ("pipe1", "pipe2", "addr") that affect results"""
+        deps = self.dependencies()
+        if self.jump_is_default:
+            deps = {name: regs for name, regs in deps.items() if name[0] == "o"}
+        used = set().union(*deps.values())
+        return [
+            field
+            for field, names in input_fields.items()
+            if any(name in used for name in names)
+        ]
+
+    @property
+    def lookup(self):
+        """Function from (pipe1, pipe2, addr) to (output, jump).
+
+        Built on first use, from a table keyed only on the arguments that
+        matter. Jump is None if the program never changes it.
+        """
+        if self._lookup is None:
+            self._lookup = self._make_lookup()
+        return self._lookup
+
+    def address_table(self, addr):
+        """Outputs and jumps for one address, as a list indexed by
+        (pipe1 << 6) | pipe2. Like lookup, jump is None if never changed.
+        """
+        if addr not in self._address_tables:
+            entries = self.table[addr :: 2**6]
+            if self.jump_is_default:
+                table = [(entry & 255, None) for entry in entries]
+            else:
+                table = [(entry & 255, entry >> 8) for entry in entries]
+            self._address_tables[addr] = table
+        return self._address_tables[addr]
+
+    def _make_lookup(self):
+        fields = self.used_fields()
+        if len(fields) == len(input_fields):
+            entries = self.table
+        else:
+            shifts = [_field_shifts[field] for field in fields]
+            entries = [
+                self.table[sum(value << shift for value, shift in zip(values, shifts))]
+                for values in itertools.product(range(64), repeat=len(fields))
+            ]
+
+        key = " | ".join(
+            f"({field} << {6 * (len(fields) - 1 - i)})"
+            for i, field in enumerate(fields)
+        )
+        key = key or "0"
+        if self.jump_is_default:
+            table = array("B", [entry & 255 for entry in entries])
+            body = [f"    return table[{key}], None"]
+        else:
+            table = array("H", entries)
+            body = [f"    entry = table[{key}]", "    return entry & 255, entry >> 8"]
+
+        source = "\n".join(["def lookup(pipe1, pipe2, addr):"] + body)
+        namespace = {"table": table}
+        exec(compile(source, "<ucode lookup>", "exec"), namespace)
+        return namespace["lookup"]
@@ -1,4 +1,5 @@
 from nano_editor import NanoEditor, outline_editor, chars_to_bools, bools_to_chars
+from screen import screen_of
 from ucode import UCode, ucode_ref_sheet
 
 
@@ -30,6 +31,7 @@ class UcodeEditor:
         self.info_editor.contents = [list(line) for line in info]
 
         self.ucode = UCode([])
+        self._last_run = None
         self.cursor = [0, 0]
         self.is_editing = False
 
@@ -44,21 +46,29 @@ class UcodeEditor:
             input2 = chars_to_bools(self.reg_editors[1].contents[0])
             addr = chars_to_bools(self.reg_editors[2].contents[0])
 
-            self.ucode = UCode(insts)
-            user, output, jump = self.ucode.run(input1, input2, addr)
-            self.reg_editors[3].contents = [bools_to_chars(user)]
-            self.reg_editors[4].contents = [bools_to_chars(output)]
-            self.reg_editors[5].contents = [bools_to_chars(jump)]
-
-            self.draw()
+            # Only rebuild and re-run when the program or inputs changed
+            if insts != self.ucode.insts:
+                self.ucode = UCode(insts)
+                self._last_run = None
+            if self._last_run != (input1, input2, addr):
+                self._last_run = (input1, input2, addr)
+                user, output, jump = self.ucode.run_bits(input1, input2, addr)
+                results = [bools_to_chars(user), bools_to_chars(output)]
+                results.append(bools_to_chars(jump))
+                self._set_results(results)
         else:
-            for i in [3, 4, 5]:
-                self.reg_editors[i].contents = [[]]
+            self._last_run = None
+            self._set_results([[], [], []])
+
+    def _set_results(self, results):
+        # Redraw only the result registers that changed
+        for i, result in zip([3, 4, 5], results):
+            if self.reg_editors[i].contents != [result]:
+                self.reg_editors[i].contents = [result]
+                self._draw_reg_editor(i)
 
     def draw(self):
-        # Clear the screen
-        # TODO: Remove this for prettiness
-        print(self.term.clear)
+        screen_of(self.term).clear()
 
         if self.is_editing:
             outline_color = (
@@ -82,32 +92,25 @@ class UcodeEditor:
         )
         self.info_editor.draw()
 
-        for i, editor, title in zip(
-            range(len(self.reg_editors)),
-            self.reg_editors,
-            [
-                "INPUT1",
-                "INPUT2",
-                "ADDR",
-                "USER",
-                "OUTPUT",
-                "JUMP",
-            ],
-        ):
-            if self.is_editing or i in [3, 4, 5]:
-                outline_color = (
-                    self.term.black_on_white
-                    if (self.cursor == [1, i])
-                    else self.term.white_on_black
-                )
-            else:
-                outline_color = (
-                    self.term.black_on_green
-                    if (self.cursor == [1, i])
-                    else self.term.green_on_black
-                )
-            outline_editor(self.term, editor, title=title, color=outline_color)
-            editor.draw()
+        for i in range(len(self.reg_editors)):
+            self._draw_reg_editor(i)
+
+    def _draw_reg_editor(self, i):
+        title = ["INPUT1", "INPUT2", "ADDR", "USER", "OUTPUT", "JUMP"][i]
+        if self.is_editing or i in [3, 4, 5]:
+            outline_color = (
+                self.term.black_on_white
+                if (self.cursor == [1, i])
+                else self.term.white_on_black
+            )
+        else:
+            outline_color = (
+                self.term.black_on_green
+                if (self.cursor == [1, i])
+                else self.term.green_on_black
+            )
+        outline_editor(self.term, self.reg_editors[i], title=title, color=outline_color)
+        self.reg_editors[i].draw()
 
     @property
     def _highlighted_editor(self):
@@ -122,7 +125,9 @@ class UcodeEditor:
                 self.is_editing = False
                 self._highlighted_editor.is_focused = False
             else:
+                # The editor redraws itself, and _evaluate any changed results
                 self._highlighted_editor.keypress(inp)
+                return True
         else:
             if inp.code == self.term.KEY_ESCAPE:
                 return False
@@ -135,7 +140,6 @@ class UcodeEditor:
             elif inp.code == self.term.KEY_RIGHT:
                 if self.cursor[0] < 1:
                     self.cursor[0] += 1
-                print(self.cursor)
             elif inp.code == self.term.KEY_UP:
                 if 0 < self.cursor[1] and self.cursor[0] == 1:
                     self.cursor[1] -= 1
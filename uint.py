@@ -1,31 +1,57 @@
-import math
+# Bits of every 6-bit number, MSB first, and the reverse
+_bits6 = [tuple(bool(number >> (5 - i) & 1) for i in range(6)) for number in range(64)]
+_numbers6 = {bits: number for number, bits in enumerate(_bits6)}
+
+
+def to_bits(number, n):
+    """The n bits of number as a list of bools, MSB first"""
+    if n == 6:
+        return list(_bits6[number])
+    return [bool(number >> (n - 1 - i) & 1) for i in range(n)]
+
+
+def from_bits(bits):
+    """The number whose bits (bools, or 0s and 1s) are given MSB first"""
+    if len(bits) == 6:
+        number = _numbers6.get(tuple(bits))
+        if number is not None:
+            return number
+    number = 0
+    for bit in bits:
+        number = (number << 1) | bool(bit)
+    return number
 
 
 class UintN:
+    __slots__ = ("number", "n")
+
     def __init__(self, number, n):
+        if number < 0 or number >> n:
+            raise ValueError(f"{number} doesn't fit in {n} bits")
         self.n = n
-        assert 0 <= number and number < 2**self.n
         self.number = number
 
-    def bits(self):
-        number = self.number
-        bits = [None] * self.n
-        for i in range(self.n):
-            bits[self.n - 1 - i] = bool(number % 2)
-            number = int(math.floor(number / 2))
+    @classmethod
+    def _make(cls, number, n):
+        # For numbers known to fit, skipping the check
+        uint = cls.__new__(cls)
+        uint.n = n
+        uint.number = number
+        return uint
 
-        return bits
+    def bits(self):
+        return to_bits(self.number, self.n)
 
     def __add__(self, other):
-        return UintN((self.number + other.number) % 2**self.n, self.n)
+        return UintN._make((self.number + other.number) & ((1 << self.n) - 1), self.n)
 
     @classmethod
     def from_bits(cls, bits):
-        n = len(bits)
-        number = sum([(2 ** (n - 1 - i)) * bits[i] for i in range(n)])
-        return cls(number, n)
+        return cls._make(from_bits(bits), len(bits))
 
 
 class Uint6(UintN):
+    __slots__ = ()
+
     def __init__(self, number):
         super().__init__(number, 6)